@@ -5,16 +5,140 @@ Supports multiple criteria types: contains, regex, json_valid, code_block, llm_j
 """
 import re
 import json
+import functools
 from typing import Tuple, Optional
-from .models import CriteriaType
+from .enums import CriteriaType, ContextPassingMode
+from .unbound_client import call_llm_for_judgment
+from . import regex_guard
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+
+def _loads(text: str):
+    """
+    Parse JSON with orjson when available, falling back to the stdlib.
+    orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the latter.
+    """
+    if orjson:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+_JSON_DECODER = json.JSONDecoder()
+# Characters a JSON document can start with (object, array, string, number, literal)
+_JSON_VALUE_START = frozenset('{["-0123456789tfn')
+# Openers of each kind tried as the start of embedded JSON; each try can
+# scan to the end of the output, so this bounds the total work
+MAX_JSON_START_POSITIONS = 32
+
+# Match ```language\ncode\n``` or ```\ncode\n```
+_CODE_BLOCK_RE = re.compile(r'```(?:\w+)?\n(.*?)```', re.DOTALL)
+# Indented code blocks (4 spaces or tab)
+_INDENTED_RE = re.compile(r'(?:^|\n)((?:    |\t).+(?:\n(?:    |\t).+)*)')
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_user(pattern: str, flags: int) -> re.Pattern:
+    """Compile a user-supplied pattern, caching it across requests."""
+    return re.compile(pattern, flags)
+
+
+# Python re's Unicode meaning of the shorthand classes, in RE2 syntax, as
+# (form inside [...], standalone form). RE2 alone reads them as ASCII-only.
+# None: no RE2 equivalent there, so the pattern is left to Python's re
+_S_CHARS = r"\t\n\x{0b}\f\r\x{1c}-\x{1f}\x{85}\p{Z}"
+_UNICODE_CLASSES = {
+    "d": (r"\p{Nd}", r"\p{Nd}"),
+    "D": (r"\P{Nd}", r"\P{Nd}"),
+    "w": (r"\p{L}\p{N}_", r"[\p{L}\p{N}_]"),
+    "W": (None, r"[^\p{L}\p{N}_]"),
+    "s": (_S_CHARS, f"[{_S_CHARS}]"),
+    "S": (None, f"[^{_S_CHARS}]"),
+    "b": ("\\b", None),  # Backspace inside a class; RE2 has no lookaround for a Unicode \b
+    "B": ("\\B", None),
+}
+
+
+def _to_re2_unicode(pattern: str) -> Optional[str]:
+    """
+    Rewrite \\d, \\w, \\s (and negations) into RE2 classes with Python's Unicode
+    meaning. Returns None if the pattern uses one that RE2 cannot express
+    (\\b, \\B, or a negated class inside brackets).
+    """
+    out = []
+    i, n = 0, len(pattern)
+    in_class = False
+    while i < n:
+        char = pattern[i]
+        if char == "\\" and i + 1 < n:
+            forms = _UNICODE_CLASSES.get(pattern[i + 1])
+            if forms is None:
+                out.append(pattern[i:i + 2])
+            else:
+                form = forms[0] if in_class else forms[1]
+                if form is None:
+                    return None
+                out.append(form)
+            i += 2
+            continue
+        out.append(char)
+        i += 1
+        if char == "[" and not in_class:
+            in_class = True
+            # A leading ^ and then a leading ] belong to the class
+            if pattern.startswith("^", i):
+                out.append("^")
+                i += 1
+            if pattern.startswith("]", i):
+                out.append("]")
+                i += 1
+        elif char == "]" and in_class:
+            in_class = False
+    return "".join(out)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_linear(pattern: str):
+    """
+    Compile a user pattern with RE2's linear-time engine (case-insensitive, multiline),
+    with \\d, \\w and \\s rewritten to keep Python's Unicode semantics.
+    Returns None when RE2 is not installed or cannot run the pattern (e.g.
+    backreferences, \\b), in which case callers fall back to Python's backtracking `re`.
+    """
+    if re2 is None:
+        return None
+    translated = _to_re2_unicode(pattern)
+    if translated is None:
+        return None
+    options = re2.Options()
+    options.log_errors = False
+    try:
+        return re2.compile(f"(?im){translated}", options)
+    except re2.error:
+        return None
+
+
+@functools.lru_cache(maxsize=32)
+def _code_blocks(text: str) -> tuple[str, ...]:
+    """
+    Memoized code-block scan. Criteria checks and context extraction for the
+    same step output all need the blocks, so the regex runs over it only once.
+    Keyed on the string itself (not id()), so entries can't be confused after GC.
+    """
+    return tuple(_CODE_BLOCK_RE.findall(text))
 
 
 def extract_code_blocks(text: str) -> list[str]:
     """Extract code blocks from markdown-formatted text."""
-    # Match ```language\ncode\n``` or ```\ncode\n```
-    pattern = r'```(?:\w+)?\n(.*?)```'
-    matches = re.findall(pattern, text, re.DOTALL)
-    return matches
+    return list(_code_blocks(text))
 
 
 def check_contains(output: str, criteria_value: str) -> Tuple[bool, str]:
@@ -22,94 +146,129 @@ def check_contains(output: str, criteria_value: str) -> Tuple[bool, str]:
     if not criteria_value:
         return False, "No string specified to search for"
     
-    if criteria_value.lower() in output.lower():
+    # Case-insensitive literal search; avoids lowercasing a copy of the whole output
+    needle = _compile_user(re.escape(criteria_value), re.IGNORECASE)
+    if needle.search(output):
         return True, f"Output contains '{criteria_value}'"
     else:
         return False, f"Output does not contain '{criteria_value}'"
 
 
+_USER_REGEX_FLAGS = re.IGNORECASE | re.MULTILINE
+
+
+def _regex_result(output: str, criteria_value: str, span: Optional[tuple[int, int]]) -> Tuple[bool, str]:
+    """Criteria result for a regex search that matched at span, or not at all."""
+    if span is None:
+        return False, f"Output does not match pattern '{criteria_value}'"
+    # Slice at most 100 chars straight from the output instead of copying the whole match
+    start, end = span
+    found = output[start:min(end, start + 100)]
+    return True, f"Output matches pattern. Found: '{found}'"
+
+
 def check_regex(output: str, criteria_value: str) -> Tuple[bool, str]:
-    """Check if output matches the regex pattern."""
+    """
+    Check if output matches the regex pattern. Patterns RE2 cannot run are
+    matched in-process here; evaluate_criteria isolates them instead.
+    """
     if not criteria_value:
         return False, "No regex pattern specified"
     
     try:
-        pattern = re.compile(criteria_value, re.IGNORECASE | re.MULTILINE)
+        pattern = _compile_linear(criteria_value)
+        if pattern is None:
+            pattern = _compile_user(criteria_value, _USER_REGEX_FLAGS)
         match = pattern.search(output)
-        if match:
-            return True, f"Output matches pattern. Found: '{match.group()[:100]}'"
-        else:
-            return False, f"Output does not match pattern '{criteria_value}'"
+        return _regex_result(output, criteria_value, match.span() if match else None)
+    except re.error as e:
+        return False, f"Invalid regex pattern: {str(e)}"
+
+
+async def check_regex_isolated(output: str, criteria_value: str) -> Tuple[bool, str]:
+    """
+    check_regex for patterns only Python's backtracking `re` accepts: the
+    search runs in regex_guard's worker process under a time limit.
+    """
+    try:
+        _compile_user(criteria_value, _USER_REGEX_FLAGS)  # Report bad syntax without the worker
+        span = await regex_guard.search(criteria_value, _USER_REGEX_FLAGS, output)
     except re.error as e:
         return False, f"Invalid regex pattern: {str(e)}"
+    except TimeoutError:
+        return False, f"Regex pattern '{criteria_value}' took longer than {regex_guard.REGEX_TIMEOUT}s to evaluate"
+    return _regex_result(output, criteria_value, span)
 
 
 def check_json_valid(output: str) -> Tuple[bool, str]:
     """Check if output is valid JSON or contains valid JSON."""
-    # Try to parse the entire output as JSON
-    try:
-        json.loads(output.strip())
-        return True, "Output is valid JSON"
-    except json.JSONDecodeError:
-        pass
+    # Try to parse the entire output as JSON, unless it cannot start a JSON value
+    stripped = output.strip()
+    if stripped[:1] in _JSON_VALUE_START:
+        try:
+            _loads(stripped)
+            return True, "Output is valid JSON"
+        except (ValueError, RecursionError):  # Deep nesting can exhaust the stdlib parser
+            pass
+    
+    # Embedded JSON must be an object or array; skip the scans for plain prose
+    if '{' not in output and '[' not in output:
+        return False, "Output does not contain valid JSON"
     
     # Try to extract JSON from code blocks first (common format)
     code_blocks = extract_code_blocks(output)
     for block in code_blocks:
         try:
-            json.loads(block.strip())
+            _loads(block.strip())
             return True, f"Found valid JSON in code block"
-        except json.JSONDecodeError:
+        except (ValueError, RecursionError):
             continue
     
-    # Try to find JSON by locating outermost { } or [ ]
-    # This handles nested JSON properly
-    for start_char, end_char in [('{', '}'), ('[', ']')]:
-        start_idx = output.find(start_char)
-        if start_idx == -1:
+    # Try to find JSON starting at each { or [. raw_decode parses a single
+    # value in C and ignores whatever trails it, so nested JSON is handled
+    # without walking the output character by character in Python.
+    for start_char, end_char in (('{', '}'), ('[', ']')):
+        # A value must close on or before the last closing bracket, so
+        # openers after it are never handed to the decoder
+        last_end = output.rfind(end_char)
+        if last_end == -1:
             continue
-        
-        # Find the matching closing bracket by counting
-        depth = 0
-        in_string = False
-        escape_next = False
-        
-        for i, char in enumerate(output[start_idx:], start_idx):
-            if escape_next:
-                escape_next = False
-                continue
-            if char == '\\':
-                escape_next = True
-                continue
-            if char == '"' and not escape_next:
-                in_string = not in_string
-                continue
-            if in_string:
-                continue
-            if char == start_char:
-                depth += 1
-            elif char == end_char:
-                depth -= 1
-                if depth == 0:
-                    # Found matching bracket
-                    json_str = output[start_idx:i+1]
-                    try:
-                        json.loads(json_str)
-                        return True, f"Found valid JSON ({len(json_str)} chars)"
-                    except json.JSONDecodeError:
-                        break  # Try next occurrence
+        start_idx = output.find(start_char, 0, last_end)
+        tries = 0
+        while start_idx != -1 and tries < MAX_JSON_START_POSITIONS:
+            tries += 1
+            try:
+                _, end_idx = _JSON_DECODER.raw_decode(output, start_idx)
+                return True, f"Found valid JSON ({end_idx - start_idx} chars)"
+            except (ValueError, RecursionError):
+                # RecursionError: brackets nested deeper than the decoder can follow
+                start_idx = output.find(start_char, start_idx + 1, last_end)
     
     return False, "Output does not contain valid JSON"
 
 
+def _has_fence_language(output: str, language: str) -> bool:
+    """
+    Check for a ```<language> fence line, ignoring case. Jumps between ``` with
+    str.find and only lowercases the few characters after each fence.
+    """
+    needle = f"{language.lower()}\n"
+    idx = output.find("```")
+    while idx != -1:
+        start = idx + 3
+        if output[start:start + len(needle)].lower() == needle:
+            return True
+        idx = output.find("```", idx + 1)
+    return False
+
+
 def check_code_block(output: str, criteria_value: Optional[str] = None) -> Tuple[bool, str]:
     """Check if output contains code blocks, optionally of a specific language."""
     code_blocks = extract_code_blocks(output)
     
     if not code_blocks:
         # Also check for indented code blocks (4 spaces or tab)
-        indented_pattern = r'(?:^|\n)((?:    |\t).+(?:\n(?:    |\t).+)*)'
-        indented_matches = re.findall(indented_pattern, output)
+        indented_matches = _INDENTED_RE.findall(output)
         if indented_matches:
             code_blocks = indented_matches
     
@@ -118,8 +277,7 @@ def check_code_block(output: str, criteria_value: Optional[str] = None) -> Tuple
     
     if criteria_value:
         # Check for specific language
-        lang_pattern = rf'```{criteria_value}\n'
-        if re.search(lang_pattern, output, re.IGNORECASE):
+        if _has_fence_language(output, criteria_value):
             return True, f"Found {len(code_blocks)} code block(s) with language '{criteria_value}'"
         else:
             return False, f"Found {len(code_blocks)} code block(s) but none with language '{criteria_value}'"
@@ -133,8 +291,6 @@ async def check_llm_judge(
     original_prompt: str
 ) -> Tuple[bool, str]:
     """Use an LLM to judge if output meets criteria."""
-    from .unbound_client import call_llm_for_judgment
-    
     if not criteria_value:
         return False, "No criteria specified for LLM judgment"
     
@@ -147,6 +303,17 @@ async def check_llm_judge(
     return result["passed"], result["explanation"]
 
 
+# Criteria type -> (is_async, handler(output, criteria_value, original_prompt))
+_HANDLERS = {
+    CriteriaType.ALWAYS_PASS: (False, lambda o, v, p: (True, "Always pass criteria - step automatically succeeds")),
+    CriteriaType.CONTAINS: (False, lambda o, v, p: check_contains(o, v or "")),
+    CriteriaType.REGEX: (False, lambda o, v, p: check_regex(o, v or "")),
+    CriteriaType.JSON_VALID: (False, lambda o, v, p: check_json_valid(o)),
+    CriteriaType.CODE_BLOCK: (False, lambda o, v, p: check_code_block(o, v)),
+    CriteriaType.LLM_JUDGE: (True, lambda o, v, p: check_llm_judge(o, v or "", p)),
+}
+
+
 async def evaluate_criteria(
     output: str,
     criteria_type: CriteriaType,
@@ -165,26 +332,100 @@ async def evaluate_criteria(
     Returns:
         Tuple of (passed: bool, details: str)
     """
-    if criteria_type == CriteriaType.ALWAYS_PASS:
-        return True, "Always pass criteria - step automatically succeeds"
+    result = fast_check(output, criteria_type, criteria_value)
+    if result is not None:
+        return result
     
-    elif criteria_type == CriteriaType.CONTAINS:
-        return check_contains(output, criteria_value or "")
+    if criteria_type == CriteriaType.REGEX:
+        return await check_regex_isolated(output, criteria_value)
+    _, check = _HANDLERS[criteria_type]
+    return await check(output, criteria_value, original_prompt)
+
+
+def fast_check(
+    output: str,
+    criteria_type: CriteriaType,
+    criteria_value: Optional[str]
+) -> Optional[Tuple[bool, str]]:
+    """
+    Evaluate local criteria (everything except the LLM judge) synchronously.
     
-    elif criteria_type == CriteriaType.REGEX:
-        return check_regex(output, criteria_value or "")
+    Args:
+        output: The LLM output to evaluate
+        criteria_type: The type of criteria to apply
+        criteria_value: The value/pattern for the criteria (if applicable)
     
-    elif criteria_type == CriteriaType.JSON_VALID:
-        return check_json_valid(output)
+    Returns:
+        Tuple of (passed: bool, details: str), or None if the criteria need
+        the awaited evaluate_criteria path (LLM judge, or a regex RE2 can't run)
+    """
+    handler = _HANDLERS.get(criteria_type)
+    if handler is None:
+        return False, f"Unknown criteria type: {criteria_type}"
+    if criteria_type == CriteriaType.REGEX and criteria_value and _compile_linear(criteria_value) is None:
+        return None
     
-    elif criteria_type == CriteriaType.CODE_BLOCK:
-        return check_code_block(output, criteria_value)
+    is_async, check = handler
+    if is_async:
+        return None
+    return check(output, criteria_value, "")
+
+
+def quick_criteria_check(
+    criteria_type: CriteriaType,
+    criteria_value: Optional[str]
+) -> bool:
+    """
+    Check, without any output, whether the criteria can pass at all.
     
-    elif criteria_type == CriteriaType.LLM_JUDGE:
-        return await check_llm_judge(output, criteria_value or "", original_prompt)
+    Args:
+        criteria_type: The type of criteria to apply
+        criteria_value: The value/pattern for the criteria (if applicable)
     
-    else:
-        return False, f"Unknown criteria type: {criteria_type}"
+    Returns:
+        False if no output can satisfy the criteria (unknown type, missing
+        value, invalid regex), True otherwise
+    """
+    if criteria_type not in _HANDLERS:
+        return False
+    if criteria_type in (CriteriaType.CONTAINS, CriteriaType.REGEX, CriteriaType.LLM_JUDGE) and not criteria_value:
+        return False
+    
+    if criteria_type == CriteriaType.REGEX and _compile_linear(criteria_value) is None:
+        try:
+            _compile_user(criteria_value, re.IGNORECASE | re.MULTILINE)
+        except re.error:
+            return False
+    return True
+
+
+# Asked of SUMMARY-mode steps so the summary arrives with the answer
+SUMMARY_MARKER = "SUMMARY:"
+SUMMARY_INSTRUCTION = (
+    f"\n\nAfter your answer, on a new line starting with `{SUMMARY_MARKER}`, "
+    "provide a 2-sentence summary of your answer for the next step."
+)
+
+
+def split_inline_summary(output: str) -> Tuple[str, Optional[str]]:
+    """
+    Split an output produced under SUMMARY_INSTRUCTION into the answer and
+    the trailing summary.
+    
+    Returns:
+        Tuple of (answer, summary), with summary None when the model did not
+        include a (non-empty) summary line
+    """
+    idx = output.rfind(SUMMARY_MARKER)
+    while idx > 0 and output[idx - 1] != "\n":
+        # Only a marker at the start of a line counts
+        idx = output.rfind(SUMMARY_MARKER, 0, idx)
+    if idx == -1:
+        return output, None
+    summary = output[idx + len(SUMMARY_MARKER):].strip().strip("`").strip()
+    if not summary:
+        return output, None
+    return output[:idx].rstrip(), summary
 
 
 def extract_context(
@@ -203,8 +444,6 @@ def extract_context(
     Returns:
         Extracted context string
     """
-    from .models import ContextPassingMode
-    
     if context_mode == ContextPassingMode.FULL or context_mode == "full":
         return output
     
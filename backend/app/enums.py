@@ -0,0 +1,37 @@
+# app/enums.py
+"""
+Enums shared by the ORM models and the API schemas, so a value is defined
+(and validated) in exactly one place.
+"""
+import enum
+
+
+class StepStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    RETRYING = "retrying"
+
+
+class ExecutionStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class CriteriaType(str, enum.Enum):
+    CONTAINS = "contains"           # Output must contain a string
+    REGEX = "regex"                 # Output must match regex
+    JSON_VALID = "json_valid"       # Output must be valid JSON
+    CODE_BLOCK = "code_block"       # Output must have code blocks
+    LLM_JUDGE = "llm_judge"         # Use LLM to evaluate
+    ALWAYS_PASS = "always_pass"     # Always pass (for testing)
+
+
+class ContextPassingMode(str, enum.Enum):
+    FULL = "full"                   # Pass entire output
+    CODE_ONLY = "code_only"         # Extract and pass only code blocks
+    SUMMARY = "summary"             # LLM summarizes before passing
+    CUSTOM = "custom"               # User-defined extraction
@@ -0,0 +1,96 @@
+# app/llm_cache.py
+"""
+On-disk cache for LLM responses.
+Shared by the Unbound client (low-temperature calls) and the workflow
+executor (opt-in exact-match cache of step outputs).
+"""
+import os
+import asyncio
+import hashlib
+import logging
+import diskcache
+import orjson
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_DISABLED = os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+cache = None if LLM_CACHE_DISABLED else diskcache.Cache(
+    os.getenv("LLM_CACHE_DIR", ".llm_cache"),
+    size_limit=2**31,
+    eviction_policy="least-recently-used"
+)
+
+# Step outputs are sampled at normal temperature, so reusing them is opt-in
+# (useful while iterating on a workflow with unchanged prompts)
+STEP_CACHE_ENABLED = cache is not None and os.getenv("LLM_STEP_CACHE", "").lower() in ("1", "true", "yes")
+STEP_CACHE_TTL = int(os.getenv("LLM_STEP_CACHE_TTL", "3600"))  # Seconds
+
+# Cache key -> task for a call that missed the cache and is still running.
+# All executions share the executor's event loop, so no lock is needed
+INFLIGHT: dict[str, asyncio.Task] = {}
+
+
+def step_key(model: str, prompt: str) -> str:
+    """Cache key for a step call: SHA-256 of the model and the exact prompt sent."""
+    return "step:" + hashlib.sha256(
+        orjson.dumps({"model": model, "prompt": prompt}, option=orjson.OPT_SORT_KEYS)
+    ).hexdigest()
+
+
+async def get_or_call(
+    model: str,
+    prompt: str,
+    call_fn: Callable[[], Awaitable[dict]],
+    ttl: int = STEP_CACHE_TTL
+) -> tuple[dict, bool]:
+    """
+    Return a cached result for (model, prompt), or await call_fn and cache it
+    if it succeeded. Concurrent misses for the same key share one call
+    instead of each paying for it.
+
+    Args:
+        model: The model the prompt is sent to
+        prompt: The full prompt
+        call_fn: Zero-argument coroutine function performing the real call
+        ttl: Seconds before a cached entry expires
+
+    Returns:
+        Tuple of (call_llm-style result dict, cache_hit: bool). Hits, including
+        callers that joined an in-flight call, report empty usage, since no
+        tokens were spent for them.
+    """
+    if cache is None:
+        return await call_fn(), False
+
+    # diskcache does file I/O; keep it off the shared executor loop
+    key = step_key(model, prompt)
+    cached = await asyncio.to_thread(cache.get, key)
+    if cached is not None:
+        logger.info(f"Step cache hit: model={model}")
+        return {**cached, "usage": {}}, True
+
+    inflight = INFLIGHT.get(key)
+    if inflight is not None:
+        logger.info(f"Step call joined in-flight request: model={model}")
+        result = await asyncio.shield(inflight)
+        if result.get("success"):
+            return {**result, "usage": {}}, True
+        return result, False
+    
+    # Shielded so a cancelled first caller doesn't cancel the call for the others
+    task = INFLIGHT[key] = asyncio.ensure_future(call_fn())
+    try:
+        result = await asyncio.shield(task)
+        # Stored before leaving INFLIGHT, so no caller misses both
+        if result.get("success"):
+            await asyncio.to_thread(cache.set, key, result, expire=ttl)
+    finally:
+        INFLIGHT.pop(key, None)
+    return result, False
+
+
+async def invalidate(model: str, prompt: str):
+    """Drop a cached step result, e.g. after it failed the step's criteria."""
+    if cache is not None:
+        await asyncio.to_thread(cache.delete, step_key(model, prompt))
@@ -1,16 +1,31 @@
 # app/main.py
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, Request, Query
+from sqlalchemy.orm import Session, selectinload, raiseload
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-from datetime import datetime
+from fastapi.responses import Response
+from sqlalchemy import func
+from typing import List, Optional
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+import orjson
 
 from . import models, schemas
 from .database import engine, SessionLocal
+from .workflow_executor import execute_workflow, create_step_executions, shutdown_executor
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Veriflow - Agentic Workflow Builder API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """On shutdown, release the executor loop's pooled Unbound API and database connections"""
+    yield
+    shutdown_executor()
+
+
+# Routes with a response_model are serialized straight to JSON bytes by
+# Pydantic; the deprecated ORJSONResponse default is not needed for that
+app = FastAPI(title="Veriflow - Agentic Workflow Builder API", lifespan=lifespan)
 
 # Allow all origins for Railway deployment
 app.add_middleware(
@@ -36,6 +51,14 @@ def get_db():
         db.close()
 
 
+def step_counts_subquery(db: Session):
+    """Step count per workflow, so list endpoints don't load every step just to count it"""
+    return db.query(
+        models.Step.workflow_id,
+        func.count(models.Step.id).label("step_count")
+    ).group_by(models.Step.workflow_id).subquery()
+
+
 # ============ WORKFLOW ENDPOINTS ============
 
 @app.post("/workflows/", response_model=schemas.Workflow)
@@ -64,15 +87,18 @@ def create_workflow(workflow: schemas.WorkflowCreate, db: Session = Depends(get_
 @app.get("/workflows/", response_model=List[schemas.WorkflowSummary])
 def list_workflows(db: Session = Depends(get_db)):
     """List all workflows with step counts"""
-    workflows = db.query(models.Workflow).all()
+    step_counts = step_counts_subquery(db)
+    rows = db.query(models.Workflow, step_counts.c.step_count).outerjoin(
+        step_counts, step_counts.c.workflow_id == models.Workflow.id
+    ).all()
     result = []
-    for wf in workflows:
+    for wf, step_count in rows:
         result.append(schemas.WorkflowSummary(
             id=wf.id,
             name=wf.name,
             description=wf.description,
             created_at=wf.created_at,
-            step_count=len(wf.steps)
+            step_count=step_count or 0
         ))
     return result
 
@@ -80,7 +106,10 @@ def list_workflows(db: Session = Depends(get_db)):
 @app.get("/workflows/{workflow_id}", response_model=schemas.Workflow)
 def get_workflow(workflow_id: int, db: Session = Depends(get_db)):
     """Get a workflow with all its steps"""
-    workflow = db.query(models.Workflow).filter(models.Workflow.id == workflow_id).first()
+    workflow = db.query(models.Workflow).options(
+        selectinload(models.Workflow.steps),
+        raiseload("*")
+    ).filter(models.Workflow.id == workflow_id).first()
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
     return workflow
@@ -160,10 +189,12 @@ def delete_step(step_id: int, db: Session = Depends(get_db)):
 # ============ EXECUTION ENDPOINTS ============
 
 @app.post("/workflows/{workflow_id}/run", response_model=schemas.RunWorkflowResponse)
-async def run_workflow(workflow_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    """Start executing a workflow"""
-    from .workflow_executor import execute_workflow
-    
+def run_workflow(workflow_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Start executing a workflow.
+    Declared sync so FastAPI runs it in the threadpool; the blocking DB session
+    must not run on the event loop.
+    """
     workflow = db.query(models.Workflow).filter(models.Workflow.id == workflow_id).first()
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
@@ -180,14 +211,8 @@ async def run_workflow(workflow_id: int, background_tasks: BackgroundTasks, db:
     db.commit()
     db.refresh(execution)
     
-    # Create step execution records for each step
-    for step in workflow.steps:
-        step_exec = models.StepExecution(
-            execution_id=execution.id,
-            step_id=step.id,
-            status=models.StepStatus.PENDING
-        )
-        db.add(step_exec)
+    # Create step execution records for each step in one multi-row INSERT
+    create_step_executions(db, execution.id, [step.id for step in workflow.steps])
     db.commit()
     
     # Run workflow in background
@@ -200,22 +225,47 @@ async def run_workflow(workflow_id: int, background_tasks: BackgroundTasks, db:
 
 
 @app.get("/executions/", response_model=List[schemas.ExecutionSummary])
-def list_executions(db: Session = Depends(get_db)):
-    """List all executions"""
-    executions = db.query(models.Execution).order_by(models.Execution.started_at.desc()).all()
+def list_executions(
+    status: Optional[schemas.ExecutionStatus] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    since: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    List executions, newest first, optionally filtered by status, restricted
+    to runs started at or after `since`, and capped at `limit`
+    """
+    step_counts = step_counts_subquery(db)
+    query = db.query(models.Execution, step_counts.c.step_count).outerjoin(
+        step_counts, step_counts.c.workflow_id == models.Execution.workflow_id
+    ).options(
+        selectinload(models.Execution.workflow)
+    )
+    if status is not None:
+        query = query.filter(models.Execution.status == status)
+    if since is not None:
+        if since.tzinfo is not None:
+            # Timestamps are stored as naive UTC
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        # Range scan on started_at (B-tree everywhere, plus BRIN on PostgreSQL)
+        query = query.filter(models.Execution.started_at >= since)
+    query = query.order_by(models.Execution.started_at.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    rows = query.all()
     result = []
-    for ex in executions:
+    for ex, step_count in rows:
         result.append(schemas.ExecutionSummary(
             id=ex.id,
             workflow_id=ex.workflow_id,
             workflow_name=ex.workflow.name,
             status=ex.status,
             current_step_order=ex.current_step_order,
-            total_steps=len(ex.workflow.steps),
+            total_steps=step_count or 0,
             started_at=ex.started_at,
             completed_at=ex.completed_at,
             total_tokens=ex.total_tokens or 0,
-            total_cost_usd=ex.total_cost_usd or "0.0"
+            total_cost_usd=ex.total_cost_usd or 0
         ))
     return result
 
@@ -223,7 +273,10 @@ def list_executions(db: Session = Depends(get_db)):
 @app.get("/executions/{execution_id}", response_model=schemas.Execution)
 def get_execution(execution_id: int, db: Session = Depends(get_db)):
     """Get execution details with all step executions"""
-    execution = db.query(models.Execution).filter(models.Execution.id == execution_id).first()
+    execution = db.query(models.Execution).options(
+        selectinload(models.Execution.step_executions).selectinload(models.StepExecution.step),
+        raiseload("*")  # Anything else the response touches must be loaded above
+    ).filter(models.Execution.id == execution_id).first()
     if not execution:
         raise HTTPException(status_code=404, detail="Execution not found")
     return execution
@@ -240,6 +293,11 @@ def get_workflow_executions(workflow_id: int, db: Session = Depends(get_db)):
         models.Execution.workflow_id == workflow_id
     ).order_by(models.Execution.started_at.desc()).all()
     
+    # The workflow is fixed, so count its steps once rather than per execution
+    total_steps = db.query(func.count(models.Step.id)).filter(
+        models.Step.workflow_id == workflow_id
+    ).scalar()
+    
     result = []
     for ex in executions:
         result.append(schemas.ExecutionSummary(
@@ -248,11 +306,11 @@ def get_workflow_executions(workflow_id: int, db: Session = Depends(get_db)):
             workflow_name=workflow.name,
             status=ex.status,
             current_step_order=ex.current_step_order,
-            total_steps=len(workflow.steps),
+            total_steps=total_steps,
             started_at=ex.started_at,
             completed_at=ex.completed_at,
             total_tokens=ex.total_tokens or 0,
-            total_cost_usd=ex.total_cost_usd or "0.0"
+            total_cost_usd=ex.total_cost_usd or 0
         ))
     return result
 
@@ -324,16 +382,28 @@ def export_workflow(workflow_id: int, db: Session = Depends(get_db)):
                     "max_retries": step.max_retries,
                     "context_mode": step.context_mode.value if hasattr(step.context_mode, 'value') else step.context_mode,
                     "context_template": step.context_template,
+                    "depends_on": step.depends_on,
                 }
                 for step in sorted(workflow.steps, key=lambda s: s.order)
             ]
         }
     }
-    return export_data
+    return Response(orjson.dumps(export_data), media_type="application/json")
+
+
+async def orjson_body(request: Request) -> dict:
+    """Parse a raw JSON object body with orjson instead of the default decoder"""
+    try:
+        data = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+    return data
 
 
 @app.post("/workflows/import")
-def import_workflow(import_data: dict, db: Session = Depends(get_db)):
+def import_workflow(import_data: dict = Depends(orjson_body), db: Session = Depends(get_db)):
     """Import a workflow from JSON definition"""
     if "workflow" not in import_data:
         raise HTTPException(status_code=400, detail="Invalid import format: missing 'workflow' key")
@@ -346,24 +416,25 @@ def import_workflow(import_data: dict, db: Session = Depends(get_db)):
         description=workflow_data.get("description", "")
     )
     db.add(workflow)
-    db.commit()
-    db.refresh(workflow)
+    db.flush()  # Get the ID
     
-    # Create steps
-    for step_data in workflow_data.get("steps", []):
-        step = models.Step(
-            workflow_id=workflow.id,
-            order=step_data.get("order", 1),
-            name=step_data.get("name", "Step"),
-            model=step_data.get("model", "kimi-k2p5"),
-            prompt=step_data.get("prompt", ""),
-            criteria_type=step_data.get("criteria_type", "always_pass"),
-            criteria_value=step_data.get("criteria_value"),
-            max_retries=step_data.get("max_retries", 3),
-            context_mode=step_data.get("context_mode", "full"),
-            context_template=step_data.get("context_template")
-        )
-        db.add(step)
+    # Create steps in one multi-row INSERT
+    db.bulk_insert_mappings(models.Step, [
+        {
+            "workflow_id": workflow.id,
+            "order": step_data.get("order", 1),
+            "name": step_data.get("name", "Step"),
+            "model": step_data.get("model", "kimi-k2p5"),
+            "prompt": step_data.get("prompt", ""),
+            "criteria_type": step_data.get("criteria_type", "always_pass"),
+            "criteria_value": step_data.get("criteria_value"),
+            "max_retries": step_data.get("max_retries", 3),
+            "context_mode": step_data.get("context_mode", "full"),
+            "context_template": step_data.get("context_template"),
+            "depends_on": step_data.get("depends_on")
+        }
+        for step_data in workflow_data.get("steps", [])
+    ])
     
     db.commit()
     db.refresh(workflow)
@@ -1,40 +1,55 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Enum, JSON
-from sqlalchemy.orm import relationship
-from datetime import datetime
-import enum
+from sqlalchemy import Integer, SmallInteger, String, Text, ForeignKey, DateTime, JSON, Index, Numeric, Boolean
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Optional
 from .database import Base
+from .enums import StepStatus, ExecutionStatus, CriteriaType, ContextPassingMode
 
 
-class StepStatus(str, enum.Enum):
-    PENDING = "pending"
-    RUNNING = "running"
-    COMPLETED = "completed"
-    FAILED = "failed"
-    RETRYING = "retrying"
+def utcnow() -> datetime:
+    """
+    Current UTC time as a naive datetime, matching the timezone-less DateTime
+    columns. Replaces the deprecated datetime.utcnow().
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
-class ExecutionStatus(str, enum.Enum):
-    PENDING = "pending"
-    RUNNING = "running"
-    COMPLETED = "completed"
-    FAILED = "failed"
+class SmallIntEnum(TypeDecorator):
+    """
+    Store a str enum as a SMALLINT code (its definition order) instead of a
+    VARCHAR/ENUM string. The ORM still reads and writes enum members, and the
+    API keeps exposing the string values.
+    
+    Codes are positional: only ever append new members to an enum.
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_class):
+        super().__init__()
+        self.enum_class = enum_class
+        self._members = list(enum_class)
+        self._codes = {member: code for code, member in enumerate(self._members)}
 
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        # Accepts enum members or their raw string values
+        return self._codes[self.enum_class(value)]
 
-class CriteriaType(str, enum.Enum):
-    CONTAINS = "contains"           # Output must contain a string
-    REGEX = "regex"                 # Output must match regex
-    JSON_VALID = "json_valid"       # Output must be valid JSON
-    CODE_BLOCK = "code_block"       # Output must have code blocks
-    LLM_JUDGE = "llm_judge"         # Use LLM to evaluate
-    ALWAYS_PASS = "always_pass"     # Always pass (for testing)
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self._members[value]
 
 
-class ContextPassingMode(str, enum.Enum):
-    FULL = "full"                   # Pass entire output
-    CODE_ONLY = "code_only"         # Extract and pass only code blocks
-    SUMMARY = "summary"             # LLM summarizes before passing
-    CUSTOM = "custom"               # User-defined extraction
+# Layout of a step prompt that carries context:
+# CONTEXT_PREFIX + context + TASK_DELIMITER + step prompt
+CONTEXT_PREFIX = "Context from previous step:\n\n"
+TASK_DELIMITER = "\n\n---\n\nYour task:\n"
 
 
 # ============ WORKFLOW DEFINITION ============
@@ -43,44 +58,54 @@ class Workflow(Base):
     """A workflow is a sequence of steps to be executed"""
     __tablename__ = "workflows"
 
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(200), nullable=False)
-    description = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(200))
+    description: Mapped[Optional[str]] = mapped_column(Text)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=utcnow)
+    updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=utcnow, onupdate=utcnow)
 
     # Relationships
-    steps = relationship("Step", back_populates="workflow", cascade="all, delete-orphan", order_by="Step.order")
-    executions = relationship("Execution", back_populates="workflow", cascade="all, delete-orphan")
+    steps: Mapped[list["Step"]] = relationship(back_populates="workflow", cascade="all, delete-orphan", order_by="Step.order")
+    # Execution history can be long; callers must load it explicitly
+    executions: Mapped[list["Execution"]] = relationship(back_populates="workflow", cascade="all, delete-orphan", lazy="raise_on_sql")
 
 
 class Step(Base):
     """A single step in a workflow"""
     __tablename__ = "steps"
 
-    id = Column(Integer, primary_key=True, index=True)
-    workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=False)
-    order = Column(Integer, nullable=False)  # Execution order (1, 2, 3...)
-    name = Column(String(200), nullable=False)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    workflow_id: Mapped[int] = mapped_column(ForeignKey("workflows.id"))
+    order: Mapped[int] = mapped_column(Integer)  # Execution order (1, 2, 3...)
+    name: Mapped[str] = mapped_column(String(200))
     
     # LLM Configuration
-    model = Column(String(100), nullable=False, default="kimi-k2p5")
-    prompt = Column(Text, nullable=False)
+    model: Mapped[str] = mapped_column(String(100), default="kimi-k2p5")
+    prompt: Mapped[str] = mapped_column(Text)
     
     # Completion Criteria
-    criteria_type = Column(Enum(CriteriaType), default=CriteriaType.ALWAYS_PASS)
-    criteria_value = Column(Text, nullable=True)  # The pattern/string/prompt for criteria
-    max_retries = Column(Integer, default=3)
+    criteria_type: Mapped[Optional[CriteriaType]] = mapped_column(SmallIntEnum(CriteriaType), default=CriteriaType.ALWAYS_PASS)
+    criteria_value: Mapped[Optional[str]] = mapped_column(Text)  # The pattern/string/prompt for criteria
+    max_retries: Mapped[Optional[int]] = mapped_column(Integer, default=3)
     
     # Context Passing
-    context_mode = Column(Enum(ContextPassingMode), default=ContextPassingMode.FULL)
-    context_template = Column(Text, nullable=True)  # Custom template for context injection
+    context_mode: Mapped[Optional[ContextPassingMode]] = mapped_column(SmallIntEnum(ContextPassingMode), default=ContextPassingMode.FULL)
+    context_template: Mapped[Optional[str]] = mapped_column(Text)  # Custom template for context injection
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Scheduling: orders of the steps this one needs; None = the previous step,
+    # [] = none, so steps whose prerequisites are done run concurrently
+    depends_on: Mapped[Optional[list[int]]] = mapped_column(JSON)
+    
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=utcnow)
+
+    __table_args__ = (
+        # Serves workflow.steps, which is always loaded in step order
+        Index("ix_step_workflow_order", "workflow_id", "order"),
+    )
 
     # Relationships
-    workflow = relationship("Workflow", back_populates="steps")
-    step_executions = relationship("StepExecution", back_populates="step", cascade="all, delete-orphan")
+    workflow: Mapped["Workflow"] = relationship(back_populates="steps")
+    step_executions: Mapped[list["StepExecution"]] = relationship(back_populates="step", cascade="all, delete-orphan")
 
 
 # ============ EXECUTION TRACKING ============
@@ -89,54 +114,84 @@ class Execution(Base):
     """A single run of a workflow"""
     __tablename__ = "executions"
 
-    id = Column(Integer, primary_key=True, index=True)
-    workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=False)
-    status = Column(Enum(ExecutionStatus), default=ExecutionStatus.PENDING)
-    current_step_order = Column(Integer, default=1)
-    started_at = Column(DateTime, default=datetime.utcnow)
-    completed_at = Column(DateTime, nullable=True)
-    error_message = Column(Text, nullable=True)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    workflow_id: Mapped[int] = mapped_column(ForeignKey("workflows.id"))
+    status: Mapped[Optional[ExecutionStatus]] = mapped_column(SmallIntEnum(ExecutionStatus), default=ExecutionStatus.PENDING)
+    current_step_order: Mapped[Optional[int]] = mapped_column(Integer, default=1)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=utcnow)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    error_message: Mapped[Optional[str]] = mapped_column(Text)
     
     # Total cost tracking for the entire run
-    total_tokens = Column(Integer, default=0)
-    total_cost_usd = Column(String(20), default="0.0")
+    total_tokens: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    total_cost_usd: Mapped[Optional[Decimal]] = mapped_column(Numeric(18, 6), default=0)  # Summed from step_executions in SQL
+
+    __table_args__ = (
+        # Per-workflow history and the global list are both ordered newest first
+        Index("ix_exec_wf_started", "workflow_id", started_at.desc()),
+        Index("ix_exec_started", started_at.desc()),
+        # Dashboard filters by status, newest first
+        Index("ix_exec_status_started", "status", started_at.desc()),
+        # Append-only time series: a tiny BRIN index serves "last N hours" scans on PostgreSQL
+        Index("ix_exec_started_brin", "started_at", postgresql_using="brin").ddl_if(dialect="postgresql"),
+    )
 
     # Relationships
-    workflow = relationship("Workflow", back_populates="executions")
-    step_executions = relationship("StepExecution", back_populates="execution", cascade="all, delete-orphan")
+    workflow: Mapped["Workflow"] = relationship(back_populates="executions")
+    step_executions: Mapped[list["StepExecution"]] = relationship(back_populates="execution", cascade="all, delete-orphan")
 
 
 class StepExecution(Base):
     """Execution details for a single step"""
     __tablename__ = "step_executions"
 
-    id = Column(Integer, primary_key=True, index=True)
-    execution_id = Column(Integer, ForeignKey("executions.id"), nullable=False)
-    step_id = Column(Integer, ForeignKey("steps.id"), nullable=False)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    execution_id: Mapped[int] = mapped_column(ForeignKey("executions.id"))
+    step_id: Mapped[int] = mapped_column(ForeignKey("steps.id"))
     
-    status = Column(Enum(StepStatus), default=StepStatus.PENDING)
-    attempt_number = Column(Integer, default=1)
+    status: Mapped[Optional[StepStatus]] = mapped_column(SmallIntEnum(StepStatus), default=StepStatus.PENDING)
+    attempt_number: Mapped[Optional[int]] = mapped_column(Integer, default=1)
     
-    # Input/Output
-    input_context = Column(Text, nullable=True)      # Context passed from previous step
-    prompt_sent = Column(Text, nullable=True)        # Actual prompt sent to LLM
-    llm_response = Column(Text, nullable=True)       # Raw LLM response
-    output_context = Column(Text, nullable=True)     # Extracted context for next step
+    # Input/Output. The context is stored once, inside prompt_sent; the hash
+    # and length identify it and let input_context be sliced back out
+    stored_input_context: Mapped[Optional[str]] = mapped_column("input_context", Text)  # Only set by older rows
+    input_context_sha256: Mapped[Optional[str]] = mapped_column(String(64))
+    input_context_len: Mapped[Optional[int]] = mapped_column(Integer)
+    prompt_sent: Mapped[Optional[str]] = mapped_column(Text)        # Actual prompt sent to LLM
+    llm_response: Mapped[Optional[str]] = mapped_column(Text)       # Raw LLM response
+    output_context: Mapped[Optional[str]] = mapped_column(Text)     # Extracted context for next step
     
     # Token/Cost tracking
-    prompt_tokens = Column(Integer, default=0)
-    completion_tokens = Column(Integer, default=0)
-    total_tokens = Column(Integer, default=0)
-    cost_usd = Column(String(20), default="0.0")     # Cost in USD as string for precision
+    prompt_tokens: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    completion_tokens: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    total_tokens: Mapped[Optional[int]] = mapped_column(Integer, default=0)
+    cost_usd: Mapped[Optional[Decimal]] = mapped_column(Numeric(18, 6), default=0)     # Exact decimal USD
+    cache_hit: Mapped[bool] = mapped_column(Boolean, default=False)  # Response served from the step cache
     
     # Criteria evaluation
-    criteria_passed = Column(Integer, default=0)  # Boolean as int for MySQL compatibility
-    criteria_details = Column(Text, nullable=True)   # Details about criteria check
+    criteria_passed: Mapped[bool] = mapped_column(Boolean, default=False)  # TINYINT(1) on MySQL
+    criteria_details: Mapped[Optional[str]] = mapped_column(Text)   # Details about criteria check
     
-    started_at = Column(DateTime, nullable=True)
-    completed_at = Column(DateTime, nullable=True)
-    error_message = Column(Text, nullable=True)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    error_message: Mapped[Optional[str]] = mapped_column(Text)
+
+    @property
+    def input_context(self) -> Optional[str]:
+        """Context passed from previous step, sliced out of prompt_sent."""
+        if self.stored_input_context is not None:
+            return self.stored_input_context
+        if self.input_context_len and self.prompt_sent:
+            start = len(CONTEXT_PREFIX)
+            return self.prompt_sent[start:start + self.input_context_len]
+        return None
+
+    __table_args__ = (
+        Index("ix_stepexec_exec_step", "execution_id", "step_id"),
+        Index("ix_stepexec_failed", "execution_id", "criteria_passed"),
+        Index("ix_stepexec_started_brin", "started_at", postgresql_using="brin").ddl_if(dialect="postgresql"),
+    )
 
     # Relationships
-    execution = relationship("Execution", back_populates="step_executions")
-    step = relationship("Step", back_populates="step_executions")
+    execution: Mapped["Execution"] = relationship(back_populates="step_executions")
+    step: Mapped["Step"] = relationship(back_populates="step_executions")
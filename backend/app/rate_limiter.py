@@ -0,0 +1,70 @@
+# app/rate_limiter.py
+"""
+Per-model token-bucket rate limiting for outgoing LLM requests.
+Shared by every execution in the process.
+"""
+import os
+import time
+import asyncio
+import threading
+
+# Default request rate and burst per model; override per model below
+DEFAULT_REQUESTS_PER_SECOND = float(os.getenv("LLM_RATE_LIMIT_RPS", "2"))
+DEFAULT_BURST = int(os.getenv("LLM_RATE_LIMIT_BURST", "5"))
+
+# model -> (requests per second, burst)
+MODEL_RATE_LIMITS: dict[str, tuple[float, int]] = {}
+
+
+class TokenBucket:
+    """
+    Token bucket that hands out reservations instead of blocking: each caller
+    takes a token immediately (the balance may go negative) and is told how
+    long to wait. Executions all run on the executor loop; the threading
+    lock only guards against callers on other threads (e.g. a sync helper).
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return the seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    async def acquire(self):
+        """Wait until this caller's request may be sent."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+LIMITERS: dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model: str) -> TokenBucket:
+    """Return the shared bucket for a model, creating it on first use."""
+    limiter = LIMITERS.get(model)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = LIMITERS.get(model)
+            if limiter is None:
+                rate, burst = MODEL_RATE_LIMITS.get(model, (DEFAULT_REQUESTS_PER_SECOND, DEFAULT_BURST))
+                limiter = LIMITERS[model] = TokenBucket(rate, burst)
+    return limiter
+
+
+async def acquire(model: str):
+    """Wait for a request slot for the given model."""
+    await get_limiter(model).acquire()
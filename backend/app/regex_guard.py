@@ -0,0 +1,79 @@
+# app/regex_guard.py
+"""
+Runs user regexes that only Python's backtracking `re` accepts (backreferences,
+lookarounds, word boundaries) in a worker process with a time limit, so a
+catastrophic pattern cannot stall the executor loop. `re` holds the GIL while
+matching, so a thread would not be enough.
+"""
+import os
+import re
+import asyncio
+import threading
+import multiprocessing
+from typing import Optional
+
+REGEX_TIMEOUT = float(os.getenv("REGEX_TIMEOUT", "5"))  # Seconds per search
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def search_span(pattern: str, flags: int, text: str) -> Optional[tuple[int, int]]:
+    """Worker side: (start, end) of the first match, or None. Match objects don't pickle."""
+    match = re.compile(pattern, flags).search(text)
+    return match.span() if match else None
+
+
+def _get_pool():
+    """Return the worker pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs threads and an event loop is unsafe
+            _pool = multiprocessing.get_context("spawn").Pool(1)
+        return _pool
+
+
+def _discard_pool(pool):
+    """Kill a pool whose worker is stuck in a search; the next search starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.terminate()
+
+
+async def search(pattern: str, flags: int, text: str, timeout: Optional[float] = None) -> Optional[tuple[int, int]]:
+    """
+    Search text with a Python `re` pattern in the worker process.
+
+    Args:
+        pattern: The regex pattern
+        flags: `re` flags
+        text: The text to search
+        timeout: Seconds to allow (default REGEX_TIMEOUT)
+
+    Returns:
+        (start, end) of the first match, or None if there is no match
+
+    Raises:
+        re.error: If the pattern is invalid
+        TimeoutError: If the search ran past the timeout (the worker is killed)
+    """
+    timeout = REGEX_TIMEOUT if timeout is None else timeout
+    pool = _get_pool()
+    result = pool.apply_async(search_span, (pattern, flags, text))
+    try:
+        return await asyncio.to_thread(result.get, timeout)
+    except multiprocessing.TimeoutError:
+        _discard_pool(pool)
+        raise TimeoutError(f"Regex search exceeded {timeout}s")
+
+
+def shutdown():
+    """Stop the worker process, if one was started."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.terminate()
@@ -2,40 +2,8 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
-from enum import Enum
-
-
-# ============ ENUMS ============
-
-class CriteriaType(str, Enum):
-    CONTAINS = "contains"
-    REGEX = "regex"
-    JSON_VALID = "json_valid"
-    CODE_BLOCK = "code_block"
-    LLM_JUDGE = "llm_judge"
-    ALWAYS_PASS = "always_pass"
-
-
-class ContextPassingMode(str, Enum):
-    FULL = "full"
-    CODE_ONLY = "code_only"
-    SUMMARY = "summary"
-    CUSTOM = "custom"
-
-
-class StepStatus(str, Enum):
-    PENDING = "pending"
-    RUNNING = "running"
-    COMPLETED = "completed"
-    FAILED = "failed"
-    RETRYING = "retrying"
-
-
-class ExecutionStatus(str, Enum):
-    PENDING = "pending"
-    RUNNING = "running"
-    COMPLETED = "completed"
-    FAILED = "failed"
+from decimal import Decimal
+from .enums import CriteriaType, ContextPassingMode, StepStatus, ExecutionStatus
 
 
 # ============ STEP SCHEMAS ============
@@ -50,6 +18,7 @@ class StepBase(BaseModel):
     max_retries: int = 3
     context_mode: ContextPassingMode = ContextPassingMode.FULL
     context_template: Optional[str] = None
+    depends_on: Optional[List[int]] = None  # Orders of prerequisite steps; None = previous step
 
 
 class StepCreate(StepBase):
@@ -66,6 +35,7 @@ class StepUpdate(BaseModel):
     max_retries: Optional[int] = None
     context_mode: Optional[ContextPassingMode] = None
     context_template: Optional[str] = None
+    depends_on: Optional[List[int]] = None
 
 
 class Step(StepBase):
@@ -124,6 +94,8 @@ class StepExecution(StepExecutionBase):
     id: int
     execution_id: int
     input_context: Optional[str] = None
+    input_context_sha256: Optional[str] = None
+    input_context_len: Optional[int] = None
     prompt_sent: Optional[str] = None
     llm_response: Optional[str] = None
     output_context: Optional[str] = None
@@ -135,7 +107,8 @@ class StepExecution(StepExecutionBase):
     prompt_tokens: int = 0
     completion_tokens: int = 0
     total_tokens: int = 0
-    cost_usd: str = "0.0"
+    cost_usd: Decimal = Decimal(0)
+    cache_hit: bool = False
     step: Optional[Step] = None
 
     class Config:
@@ -160,7 +133,7 @@ class Execution(ExecutionBase):
     completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
     total_tokens: int = 0
-    total_cost_usd: str = "0.0"
+    total_cost_usd: Decimal = Decimal(0)
     step_executions: List[StepExecution] = []
 
     class Config:
@@ -177,7 +150,7 @@ class ExecutionSummary(BaseModel):
     started_at: datetime
     completed_at: Optional[datetime] = None
     total_tokens: int = 0
-    total_cost_usd: str = "0.0"
+    total_cost_usd: Decimal = Decimal(0)
 
     class Config:
         from_attributes = True
@@ -5,8 +5,19 @@ Replace UNBOUND_API_KEY with your actual API key from the hackathon.
 """
 import httpx
 import os
+import re
+import time
+import random
+import asyncio
+import hashlib
+import functools
 import logging
+import orjson
+from decimal import Decimal
+from email.utils import parsedate_to_datetime
 from typing import Optional
+from .llm_cache import cache as _cache
+from .rate_limiter import acquire as acquire_rate_limit
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -18,6 +29,8 @@ UNBOUND_API_KEY = os.getenv("UNBOUND_API_KEY", "c87829d8a0dd941e60fa2a2e265728f0
 # Model mapping (Unbound may use different model IDs)
 # Most models use direct IDs, no mapping needed
 MODEL_MAPPING = {}
+# Identity when there is nothing to map, so call_llm skips the dict probe
+_MAP_GET = dict(MODEL_MAPPING).get if MODEL_MAPPING else (lambda model, default=None: model)
 
 # Cost per 1M tokens (approximate - adjust based on actual pricing)
 # These are example rates - update with actual Unbound pricing
@@ -35,13 +48,128 @@ MODEL_TIERS = [
 
 DEFAULT_COST = {"input": 0.50, "output": 1.50}  # Fallback for unknown models
 
+# Rates above in micro-USD per 1M tokens, so cost accounting never touches floats
+_RATES_MICRO = {
+    model: (round(costs["input"] * 1_000_000), round(costs["output"] * 1_000_000))
+    for model, costs in MODEL_COSTS.items()
+}
+_DEFAULT_RATES_MICRO = (round(DEFAULT_COST["input"] * 1_000_000), round(DEFAULT_COST["output"] * 1_000_000))
+
+# Indicators of complex tasks, matched as case-insensitive substrings in one pass
+COMPLEX_INDICATORS = [
+    "code", "function", "class", "implement", "algorithm",
+    "analyze", "reason", "explain why", "step by step",
+    "json schema", "validate", "debug", "optimize"
+]
+_COMPLEX_RE = re.compile("|".join(map(re.escape, COMPLEX_INDICATORS)), re.IGNORECASE)
+
+# On-disk response cache for low-temperature calls (judgments, summaries),
+# which are effectively deterministic and get re-issued across retries and re-runs
+LLM_CACHE_MAX_TEMPERATURE = 0.2
+
+# Judge response format: "PASSED: YES|NO" and "EXPLANATION: ...", in any case
+_JUDGE_PASSED_RE = re.compile(r"PASSED:\s*(YES|NO)\b", re.IGNORECASE)
+_JUDGE_EXPLANATION_RE = re.compile(r"EXPLANATION:\s*(.*)", re.IGNORECASE | re.DOTALL)
+
+# Shared HTTP clients, one per event loop: connections are bound to the loop
+# that opened them. All executions share the executor's loop, so normally
+# there is exactly one; a loop recreated after shutdown gets its own
+_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+# Every request is an authenticated JSON POST; set once as client defaults
+_HEADERS = {
+    "Authorization": f"Bearer {UNBOUND_API_KEY}",
+    "Content-Type": "application/json",
+}
+
+# HTTP/2 multiplexes concurrent calls over one TLS connection; needs the h2 extra
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the pooled keep-alive client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(180.0),
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            headers=_HEADERS,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def aclose():
+    """Close the HTTP client bound to the running event loop, if any."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+# Retry backoff: jittered exponential, capped; server hints are honored up to the max
+RETRY_BACKOFF_CAP = 30.0
+RETRY_AFTER_MAX = 120.0
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """
+    Read how long the server asked us to wait from Retry-After (seconds or
+    HTTP date) or X-RateLimit-Reset (delta seconds or epoch timestamp).
+    Returns None when there is no usable hint.
+    """
+    value = response.headers.get("Retry-After")
+    if value:
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                seconds = None
+        if seconds is not None:
+            return min(max(seconds, 0.0), RETRY_AFTER_MAX)
+    
+    value = response.headers.get("X-RateLimit-Reset")
+    if value:
+        try:
+            seconds = float(value)
+        except ValueError:
+            return None
+        if seconds > 1_000_000_000:  # Epoch timestamp rather than a delta
+            seconds -= time.time()
+        return min(max(seconds, 0.0), RETRY_AFTER_MAX)
+    
+    return None
+
+
+def calculate_cost_micros(model: str, prompt_tokens: int, completion_tokens: int) -> int:
+    """Calculate cost in micro-USD, rounded half up, using integer arithmetic only."""
+    rate_in, rate_out = _RATES_MICRO.get(model, _DEFAULT_RATES_MICRO)
+    return (prompt_tokens * rate_in + completion_tokens * rate_out + 500_000) // 1_000_000
+
+
+def calculate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Decimal:
+    """Calculate cost in USD based on token usage, exact to six decimal places."""
+    return Decimal(calculate_cost_micros(model, prompt_tokens, completion_tokens)).scaleb(-6)
+
+
+# Prompts longer than this are complex without scanning for indicators
+COMPLEX_PROMPT_LENGTH = 1000
 
-def calculate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
-    """Calculate cost in USD based on token usage."""
-    costs = MODEL_COSTS.get(model, DEFAULT_COST)
-    input_cost = (prompt_tokens / 1_000_000) * costs["input"]
-    output_cost = (completion_tokens / 1_000_000) * costs["output"]
-    return round(input_cost + output_cost, 6)
+
+@functools.lru_cache(maxsize=4096)
+def _has_complex_indicator(prompt: str) -> bool:
+    """
+    Memoized keyword scan. Only prompts up to COMPLEX_PROMPT_LENGTH reach it,
+    so the cache holds at most a few MB and re-runs/retries skip the regex.
+    """
+    return _COMPLEX_RE.search(prompt) is not None
 
 
 def select_model_for_task(prompt: str, criteria_type: str = "always_pass") -> str:
@@ -52,19 +180,10 @@ def select_model_for_task(prompt: str, criteria_type: str = "always_pass") -> st
     - Short prompts with simple criteria → use cheaper model
     - Long prompts, code generation, or complex criteria → use better model
     """
-    prompt_length = len(prompt)
-    
-    # Indicators of complex tasks
-    complex_indicators = [
-        "code", "function", "class", "implement", "algorithm",
-        "analyze", "reason", "explain why", "step by step",
-        "json schema", "validate", "debug", "optimize"
-    ]
-    
     is_complex = (
-        prompt_length > 1000 or
+        len(prompt) > COMPLEX_PROMPT_LENGTH or
         criteria_type in ["llm_judge", "json_valid", "code_block"] or
-        any(indicator in prompt.lower() for indicator in complex_indicators)
+        _has_complex_indicator(prompt)
     )
     
     if is_complex:
@@ -73,13 +192,37 @@ def select_model_for_task(prompt: str, criteria_type: str = "always_pass") -> st
         return "kimi-k2-instruct-0905"  # Cheaper model for simple tasks
 
 
+async def _read_event_stream(response: httpx.Response) -> dict:
+    """
+    Assemble a streamed (SSE) chat completion into the same shape as a
+    non-streamed response body, concatenating content deltas as they arrive.
+    """
+    deltas = []
+    usage = {}
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        chunk = orjson.loads(data)
+        for choice in chunk.get("choices") or ():
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                deltas.append(content)
+        if chunk.get("usage"):
+            usage = chunk["usage"]
+    return {"choices": [{"message": {"content": "".join(deltas)}}], "usage": usage}
+
+
 async def call_llm(
     model: str,
     prompt: str,
     context: Optional[str] = None,
     system_prompt: Optional[str] = None,
     max_tokens: int = 4000,
-    temperature: float = 0.7
+    temperature: float = 0.7,
+    stream: bool = False
 ) -> dict:
     """
     Call an LLM via the Unbound API.
@@ -91,23 +234,23 @@ async def call_llm(
         system_prompt: Optional system prompt
         max_tokens: Maximum tokens in response
         temperature: Sampling temperature
+        stream: Request a server-sent event stream and assemble the reply
+            while it downloads, rather than waiting for the full body
     
     Returns:
         dict with 'success', 'response', and optionally 'error'
     """
-    # Build the full prompt with context if provided
-    full_prompt = prompt
-    if context:
-        full_prompt = f"Context from previous step:\n{context}\n\n---\n\n{prompt}"
-    
-    # Build messages
+    # Build messages; context travels as its own system message rather than
+    # being copied into the prompt, which also lets the provider cache it
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
-    messages.append({"role": "user", "content": full_prompt})
+    if context:
+        messages.append({"role": "system", "content": f"Context from previous step:\n{context}"})
+    messages.append({"role": "user", "content": prompt})
     
     # Map model ID
-    mapped_model = MODEL_MAPPING.get(model, model)
+    mapped_model = _MAP_GET(model, model)
     
     # Prepare request
     payload = {
@@ -116,56 +259,93 @@ async def call_llm(
         "max_tokens": max_tokens,
         "temperature": temperature,
     }
+    if stream:
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}  # Usage arrives in the final chunk
     
-    headers = {
-        "Authorization": f"Bearer {UNBOUND_API_KEY}",
-        "Content-Type": "application/json",
-    }
+    # Serve repeat low-temperature requests from the cache
+    cache_key = None
+    if _cache is not None and temperature <= LLM_CACHE_MAX_TEMPERATURE:
+        cache_key = hashlib.blake2b(
+            orjson.dumps(
+                {"m": mapped_model, "msgs": messages, "t": temperature, "mx": max_tokens},
+                option=orjson.OPT_SORT_KEYS
+            ),
+            digest_size=16
+        ).hexdigest()
+        # Disk I/O; keep it off the event loop, as llm_cache.get_or_call does
+        cached = await asyncio.to_thread(_cache.get, cache_key)
+        if cached is not None:
+            logger.info(f"LLM cache hit: model={mapped_model}")
+            return {**cached, "usage": {}}  # No tokens were spent on this call
     
     try:
-        logger.info(f"Calling Unbound API: model={mapped_model}, prompt_length={len(full_prompt)}")
+        logger.info(
+            "Calling Unbound API: model=%s, prompt_length=%d, context_length=%d",
+            mapped_model, len(prompt), len(context) if context else 0
+        )
         
-        # Use synchronous requests with retry logic for connection issues
-        import requests
-        from requests.adapters import HTTPAdapter
-        from urllib3.util.retry import Retry
-        import time
+        client = get_client()
+        # Serialize once; retries resend the same bytes
+        body = orjson.dumps(payload)
         
         # Retry logic with manual backoff for connection errors
         max_retries = 5
         last_error = None
+        retry_after = None
         
         for attempt in range(max_retries):
             try:
                 if attempt > 0:
-                    wait_time = 2 ** attempt  # 2, 4, 8, 16 seconds
-                    logger.info(f"Retry attempt {attempt + 1}/{max_retries}, waiting {wait_time}s...")
-                    time.sleep(wait_time)
+                    # Server hint if given, else ~2, 4, 8, 16s with jitter so
+                    # concurrent executions don't retry in lockstep
+                    if retry_after is not None:
+                        wait_time = retry_after
+                    else:
+                        wait_time = random.uniform(0.5, 1.5) * min(RETRY_BACKOFF_CAP, 2 ** attempt)
+                    retry_after = None
+                    logger.info(f"Retry attempt {attempt + 1}/{max_retries}, waiting {wait_time:.1f}s...")
+                    await asyncio.sleep(wait_time)
                 
-                # Use fresh session with connection: close to avoid keep-alive issues
-                headers["Connection"] = "close"
+                # Shared per-model token bucket spaces requests across all executions
+                await acquire_rate_limit(mapped_model)
                 
-                response = requests.post(
-                    UNBOUND_API_URL,
-                    json=payload,
-                    headers=headers,
-                    timeout=180
-                )
+                data = None
+                if stream:
+                    async with client.stream(
+                        "POST",
+                        UNBOUND_API_URL,
+                        content=body
+                    ) as response:
+                        if response.status_code == 200:
+                            data = await _read_event_stream(response)
+                        else:
+                            await response.aread()  # Error bodies are small; load for the message
+                else:
+                    response = await client.post(
+                        UNBOUND_API_URL,
+                        content=body
+                    )
                 
                 logger.info(f"API response status: {response.status_code}")
                 
                 if response.status_code == 200:
-                    data = response.json()
+                    if data is None:
+                        data = orjson.loads(response.content)
                     # OpenAI-compatible response format
                     content = data.get("choices", [{}])[0].get("message", {}).get("content", "")
-                    return {
+                    result = {
                         "success": True,
                         "response": content,
                         "usage": data.get("usage", {}),
                     }
+                    if cache_key is not None:
+                        await asyncio.to_thread(_cache.set, cache_key, result)
+                    return result
                 elif response.status_code in [429, 500, 502, 503, 504]:
                     # Retryable server errors
                     last_error = f"API error: {response.status_code} - {response.text[:200]}"
+                    retry_after = _retry_after_seconds(response)
                     logger.warning(f"Retryable error on attempt {attempt + 1}: {last_error}")
                     continue
                 else:
@@ -176,12 +356,12 @@ async def call_llm(
                         "response": None,
                     }
                     
-            except requests.Timeout:
+            except httpx.TimeoutException:
                 last_error = "Request timed out after 180 seconds"
                 logger.warning(f"Timeout on attempt {attempt + 1}")
                 continue
                 
-            except (requests.ConnectionError, requests.RequestException) as e:
+            except httpx.HTTPError as e:
                 last_error = f"Connection error: {str(e)}"
                 logger.warning(f"Connection error on attempt {attempt + 1}: {e}")
                 continue
@@ -249,13 +429,15 @@ EXPLANATION: [Brief explanation of your judgment]
             "explanation": f"Could not evaluate: {result['error']}"
         }
     
-    response = result["response"].upper()
-    passed = "PASSED: YES" in response or "PASSED:YES" in response
+    response = result["response"]
+    verdict = _JUDGE_PASSED_RE.search(response)
+    passed = verdict is not None and verdict.group(1).upper() == "YES"
     
     # Extract explanation
-    explanation = result["response"]
-    if "EXPLANATION:" in result["response"]:
-        explanation = result["response"].split("EXPLANATION:", 1)[1].strip()
+    explanation = response
+    match = _JUDGE_EXPLANATION_RE.search(response)
+    if match:
+        explanation = match.group(1).strip()
     
     return {
         "passed": passed,
@@ -263,22 +445,73 @@ EXPLANATION: [Brief explanation of your judgment]
     }
 
 
+# Rough characters-per-token ratio used to size summaries without a tokenizer
+CHARS_PER_TOKEN = 4
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def summarize_locally(content: str, max_chars: int) -> str:
+    """
+    Extractive summary without an LLM call: keep whole sentences from the
+    start and end of the content (where intros and conclusions live),
+    alternating between them until the character budget is spent.
+    """
+    if len(content) <= max_chars:
+        return content
+    
+    sentences = _SENTENCE_SPLIT_RE.split(content)
+    head, tail = [], []
+    used = 0
+    i, j = 0, len(sentences) - 1
+    while i <= j:
+        take_head = len(head) <= len(tail)
+        sentence = sentences[i] if take_head else sentences[j]
+        if used + len(sentence) + 1 > max_chars:
+            break
+        used += len(sentence) + 1
+        if take_head:
+            head.append(sentence)
+            i += 1
+        else:
+            tail.append(sentence)
+            j -= 1
+    
+    if not head:
+        # A single run-on "sentence" longer than the budget
+        return content[:max_chars] + "... [truncated]"
+    return " ".join(head) + " [...] " + " ".join(reversed(tail))
+
+
 async def summarize_for_context(
     content: str,
     max_tokens: int = 500,
-    model: str = "kimi-k2p5"
+    model: str = "kimi-k2p5",
+    strategy: str = "llm"
 ) -> str:
     """
     Summarize content to create context for the next step.
     
+    Content that already fits in max_tokens is returned unchanged, so short
+    outputs never cost a summarization call.
+    
     Args:
         content: The content to summarize
         max_tokens: Maximum tokens for the summary
         model: Model to use for summarization
+        strategy: "llm" to summarize with the model, "local" for the
+            extractive head/tail summary with no API call
     
     Returns:
         Summarized content
     """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(content) < max_chars:
+        return content
+    
+    if strategy == "local":
+        return summarize_locally(content, max_chars)
+    
     summary_prompt = f"""Summarize the following content concisely, preserving key information, code snippets, and important details:
 
 {content}
@@ -295,5 +528,5 @@ Provide a clear, structured summary that captures the essential points."""
     if result["success"]:
         return result["response"]
     else:
-        # Return truncated original if summarization fails
-        return content[:2000] + "... [truncated]" if len(content) > 2000 else content
+        # Fall back to the local summary if summarization fails
+        return summarize_locally(content, max_chars)
@@ -3,42 +3,232 @@
 Workflow execution engine.
 Runs workflows step by step, calling LLMs, checking criteria, and passing context.
 """
+import random
 import asyncio
+import hashlib
 import logging
-from datetime import datetime
+import threading
+from decimal import Decimal
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, update, select, func
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database import SessionLocal
+from .database import AsyncSessionLocal, async_engine
 from .models import (
     Execution, StepExecution, Step, Workflow,
-    ExecutionStatus, StepStatus, ContextPassingMode
+    ExecutionStatus, StepStatus, ContextPassingMode, utcnow,
+    CONTEXT_PREFIX, TASK_DELIMITER
 )
-from .unbound_client import call_llm, summarize_for_context, calculate_cost, select_model_for_task
-from .criteria_checker import evaluate_criteria, extract_context
+from .unbound_client import call_llm, summarize_for_context, calculate_cost, select_model_for_task, aclose
+from .criteria_checker import evaluate_criteria, fast_check, quick_criteria_check, extract_context, split_inline_summary, SUMMARY_INSTRUCTION
+from . import llm_cache, regex_guard
 
 # Configure logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
-def get_db_session() -> Session:
-    """Create a new database session."""
-    return SessionLocal()
+# Retry backoff bases (seconds): an LLM error suggests upstream trouble, so
+# wait longer than after a response that merely failed the criteria
+LLM_ERROR_BACKOFF_BASE = 2.0
+CRITERIA_FAIL_BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# Usage columns for a call that spent no tokens (cache hit or failed request)
+NO_USAGE = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cost_usd": Decimal(0)}
+
+
+def jittered_backoff(attempt: int, base: float = 1.0, cap: float = BACKOFF_CAP) -> float:
+    """
+    Delay before retrying after the given (1-based) attempt, with full
+    jitter: uniform between 0 and base * 2^(attempt-1), capped, so concurrent
+    executions retrying against the same provider spread out instead of
+    arriving together, starting with the first retry.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def get_db_session() -> AsyncSession:
+    """
+    Create a new async database session, so DB round trips yield to the event
+    loop instead of blocking it. Attributes are not expired on commit, so
+    reading loaded objects never triggers a sync load.
+    """
+    return AsyncSessionLocal()
+
+
+def insert_step_executions(execution_id: int, step_ids: list[int]):
+    """Multi-row INSERT of PENDING step execution records for the given (non-empty) steps."""
+    return insert(StepExecution).values([
+        {"execution_id": execution_id, "step_id": step_id, "status": StepStatus.PENDING}
+        for step_id in step_ids
+    ])
+
+
+def create_step_executions(db: Session, execution_id: int, step_ids: list[int]):
+    """
+    Insert PENDING step execution records for the given steps as one
+    multi-row INSERT. The caller commits.
+    """
+    if not step_ids:
+        return
+    db.execute(insert_step_executions(execution_id, step_ids))
+
+
+def execution_totals(execution_id: int) -> dict:
+    """SET clauses rolling step token usage and cost up into the execution row, computed in SQL."""
+    step_rows = StepExecution.execution_id == execution_id
+    return {
+        "total_tokens": select(
+            func.coalesce(func.sum(StepExecution.total_tokens), 0)
+        ).where(step_rows).scalar_subquery(),
+        "total_cost_usd": select(
+            func.coalesce(func.sum(StepExecution.cost_usd), 0)
+        ).where(step_rows).scalar_subquery(),
+    }
+
+
+async def write_execution(db: AsyncSession, execution_id: int, **values):
+    """Update the execution row with a single UPDATE and commit."""
+    await db.execute(
+        update(Execution)
+        .where(Execution.id == execution_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+
+
+async def finish_execution(
+    db: AsyncSession,
+    execution_id: int,
+    status: ExecutionStatus,
+    error_message: Optional[str] = None,
+    roll_up_totals: bool = True
+):
+    """Record the final status, optionally with totals, in one UPDATE."""
+    values = {"status": status, "completed_at": utcnow(), "error_message": error_message}
+    if roll_up_totals:
+        values.update(execution_totals(execution_id))
+    await write_execution(db, execution_id, **values)
+
+
+# Interim step writes (attempt started, retry scheduled) only feed the
+# progress display, so they are buffered and flushed in the background
+# instead of putting a commit in front of every LLM call
+INTERIM_FLUSH_INTERVAL = 0.1  # Seconds
+INTERIM_FLUSH_BATCH = 32      # Step executions with pending writes
+
+# step_execution_id -> fields not yet written. Later writes for the same row
+# merge into one entry, so the buffer holds at most one per running step
+_pending_writes: dict[int, dict] = {}
+# Entries taken by a flush that has not committed yet
+_flushing_writes: dict[int, dict] = {}
+_flush_now: Optional[asyncio.Event] = None
+_writer_task: Optional[asyncio.Task] = None
+
+
+async def flush_interim_writes():
+    """
+    Write all buffered interim fields in one transaction. Rows that already
+    have completed_at are skipped, so a flush landing after a step's
+    terminal write cannot overwrite its outcome. If the transaction fails,
+    the batch goes back into the buffer for the next flush or the step's
+    terminal write, so fields such as prompt_sent are not lost.
+    """
+    if not _pending_writes:
+        return
+    batch = dict(_pending_writes)
+    _pending_writes.clear()
+    _flushing_writes.update(batch)
+    try:
+        async with get_db_session() as db:
+            for step_execution_id, fields in batch.items():
+                await db.execute(
+                    update(StepExecution)
+                    .where(StepExecution.id == step_execution_id, StepExecution.completed_at.is_(None))
+                    .values(**fields)
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+    except Exception as e:
+        # Re-queue rows whose terminal write has not already taken them,
+        # under any fields queued since
+        requeued = [i for i in batch if i in _flushing_writes]
+        for step_execution_id in requeued:
+            _pending_writes[step_execution_id] = {
+                **_flushing_writes[step_execution_id],
+                **_pending_writes.get(step_execution_id, {}),
+            }
+        logger.warning(f"Interim write of {len(batch)} step(s) failed, re-queued {len(requeued)}: {e}")
+    finally:
+        for step_execution_id in batch:
+            _flushing_writes.pop(step_execution_id, None)
+
+
+async def _interim_writer():
+    """Flush buffered writes every INTERIM_FLUSH_INTERVAL, or sooner when the batch fills."""
+    while True:
+        try:
+            await asyncio.wait_for(_flush_now.wait(), INTERIM_FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _flush_now.clear()
+        await flush_interim_writes()
+
+
+def queue_step_execution_write(step_execution_id: int, fields: dict):
+    """Buffer field changes for the background writer and clear them."""
+    global _flush_now, _writer_task
+    if _writer_task is None or _writer_task.done():
+        # Start the writer on the running (executor) loop
+        _flush_now = asyncio.Event()
+        _writer_task = asyncio.get_running_loop().create_task(_interim_writer())
+    _pending_writes.setdefault(step_execution_id, {}).update(fields)
+    fields.clear()
+    if len(_pending_writes) >= INTERIM_FLUSH_BATCH:
+        _flush_now.set()
+
+
+async def write_step_execution(db: AsyncSession, step_execution_id: int, fields: dict):
+    """
+    Write the accumulated field changes as a single UPDATE, commit, and clear
+    them. Interim fields for the row that are buffered or still being flushed
+    go into the same UPDATE (and are taken from the buffer), so none are lost
+    if that flush is skipped or fails.
+    """
+    values = {
+        **_flushing_writes.pop(step_execution_id, {}),
+        **_pending_writes.pop(step_execution_id, {}),
+        **fields,
+    }
+    await db.execute(
+        update(StepExecution)
+        .where(StepExecution.id == step_execution_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    fields.clear()
 
 
 async def execute_step(
     step: Step,
-    step_execution: StepExecution,
+    step_execution_id: int,
     input_context: Optional[str],
-    db: Session
+    db: AsyncSession
 ) -> tuple[bool, Optional[str]]:
     """
     Execute a single step with retry logic.
     
+    Changes to the step execution record are collected in a dict. Progress
+    (attempt started, retry scheduled) is handed to the background writer;
+    the final outcome is written with one UPDATE before returning.
+    
     Args:
         step: The step definition
-        step_execution: The execution record to update
+        step_execution_id: ID of the execution record to update
         input_context: Context from previous step
         db: Database session
     
@@ -47,240 +237,435 @@ async def execute_step(
     """
     max_attempts = step.max_retries + 1  # Initial attempt + retries
     
+    # Enum values never change during a step; resolve them once
+    criteria_type_str = getattr(step.criteria_type, 'value', step.criteria_type)
+    context_mode_str = getattr(step.context_mode, 'value', step.context_mode)
+    
+    # Build the full prompt with context once; it is identical for every attempt
+    prefix = f"{CONTEXT_PREFIX}{input_context}{TASK_DELIMITER}" if input_context else ""
+    task_prompt = prefix + step.prompt
+    suffix = SUMMARY_INSTRUCTION if context_mode_str == ContextPassingMode.SUMMARY else ""  # Summary arrives with the answer
+    full_prompt = task_prompt + suffix
+    # The context is already inside prompt_sent; record only its hash and length
+    fields = {
+        "prompt_sent": full_prompt,
+        "input_context_sha256": hashlib.sha256(input_context.encode()).hexdigest() if input_context else None,
+        "input_context_len": len(input_context) if input_context else None,
+    }
+    
+    # Determine model - use auto-selection if "auto" is specified. Routing
+    # depends only on the prompt and criteria, so retries reuse the choice.
+    # The summary instruction is ours, not the task's, so it is not routed on
+    model_to_use = step.model
+    if step.model == "auto":
+        model_to_use = select_model_for_task(task_prompt, criteria_type_str)
+        logger.info(f"Auto-selected model: {model_to_use}")
+    
+    # Criteria that no output can satisfy (missing value, invalid regex)
+    # fail the step up front instead of spending every attempt on the LLM
+    if not quick_criteria_check(step.criteria_type, step.criteria_value):
+        passed, details = await evaluate_criteria(
+            output="",
+            criteria_type=step.criteria_type,
+            criteria_value=step.criteria_value,
+            original_prompt=step.prompt
+        )
+        logger.warning(f"Step '{step.name}' criteria can never pass: {details}")
+        fields["attempt_number"] = 0  # No LLM attempt was made
+        fields["status"] = StepStatus.FAILED
+        fields["criteria_passed"] = False
+        fields["criteria_details"] = details
+        fields["error_message"] = f"Criteria not met: {details}"
+        fields["started_at"] = fields["completed_at"] = utcnow()
+        await write_step_execution(db, step_execution_id, fields)
+        return False, None
+    
     for attempt in range(1, max_attempts + 1):
-        # Update attempt number
+        # Mark the attempt as started so the UI can show progress
         logger.info(f"Step '{step.name}' attempt {attempt}/{max_attempts}")
-        step_execution.attempt_number = attempt
-        step_execution.status = StepStatus.RUNNING if attempt == 1 else StepStatus.RETRYING
-        step_execution.started_at = datetime.utcnow()
-        step_execution.input_context = input_context
-        db.commit()
-        
-        # Build the full prompt with context
-        full_prompt = step.prompt
-        if input_context:
-            full_prompt = f"Context from previous step:\n\n{input_context}\n\n---\n\nYour task:\n{step.prompt}"
+        fields["attempt_number"] = attempt
+        fields["status"] = StepStatus.RUNNING if attempt == 1 else StepStatus.RETRYING
+        fields["started_at"] = utcnow()
+        queue_step_execution_write(step_execution_id, fields)
         
-        step_execution.prompt_sent = full_prompt
-        db.commit()
+        # Everything below is accumulated in fields and written once when
+        # the attempt finishes
         
-        # Determine model - use auto-selection if "auto" is specified
-        model_to_use = step.model
-        if step.model == "auto":
-            criteria_type_str = step.criteria_type.value if hasattr(step.criteria_type, 'value') else step.criteria_type
-            model_to_use = select_model_for_task(full_prompt, criteria_type_str)
-            logger.info(f"Auto-selected model: {model_to_use}")
-        
-        # Call the LLM
+        # Call the LLM; the first attempt may be served from the step cache,
+        # retries always go to the model for a fresh sample
         logger.info(f"Calling LLM model={model_to_use}")
-        result = await call_llm(
-            model=model_to_use,
-            prompt=full_prompt
-        )
-        logger.info(f"LLM result: success={result['success']}")
+        use_step_cache = llm_cache.STEP_CACHE_ENABLED and attempt == 1
+        if use_step_cache:
+            result, cache_hit = await llm_cache.get_or_call(
+                model_to_use,
+                full_prompt,
+                lambda: call_llm(model=model_to_use, prompt=full_prompt)
+            )
+        else:
+            result = await call_llm(
+                model=model_to_use,
+                prompt=full_prompt
+            )
+            cache_hit = False
+        fields["cache_hit"] = cache_hit
+        logger.info(f"LLM result: success={result['success']}, cache_hit={cache_hit}")
         
-        # Store token usage if available
-        usage = result.get("usage", {})
-        step_execution.prompt_tokens = usage.get("prompt_tokens", 0)
-        step_execution.completion_tokens = usage.get("completion_tokens", 0)
-        step_execution.total_tokens = usage.get("total_tokens", 0)
-        step_execution.cost_usd = str(calculate_cost(
-            model_to_use,
-            step_execution.prompt_tokens,
-            step_execution.completion_tokens
-        ))
-        db.commit()
+        # Store token usage if available; cache hits and failed calls have
+        # none, so skip the lookups and the cost arithmetic for them
+        usage = result.get("usage")
+        if usage:
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            fields["prompt_tokens"] = prompt_tokens
+            fields["completion_tokens"] = completion_tokens
+            fields["total_tokens"] = usage.get("total_tokens", 0)
+            fields["cost_usd"] = calculate_cost(model_to_use, prompt_tokens, completion_tokens)
+        else:
+            fields.update(NO_USAGE)
         
         if not result["success"]:
-            step_execution.error_message = result["error"]
-            step_execution.llm_response = None
-            db.commit()
+            fields["error_message"] = result["error"]
+            fields["llm_response"] = None
             
             if attempt < max_attempts:
-                await asyncio.sleep(2)  # Wait before retry
+                queue_step_execution_write(step_execution_id, fields)
+                await asyncio.sleep(jittered_backoff(attempt, LLM_ERROR_BACKOFF_BASE))
                 continue
             else:
-                step_execution.status = StepStatus.FAILED
-                step_execution.completed_at = datetime.utcnow()
-                db.commit()
+                fields["status"] = StepStatus.FAILED
+                fields["completed_at"] = utcnow()
+                await write_step_execution(db, step_execution_id, fields)
                 return False, None
         
         # Store the response
         llm_response = result["response"]
-        step_execution.llm_response = llm_response
-        db.commit()
+        fields["llm_response"] = llm_response
         
-        # Evaluate criteria
-        passed, details = await evaluate_criteria(
-            output=llm_response,
-            criteria_type=step.criteria_type,
-            criteria_value=step.criteria_value,
-            original_prompt=step.prompt
-        )
+        # Criteria apply to the answer itself, not the requested summary line
+        answer, inline_summary = llm_response, None
+        if context_mode_str == ContextPassingMode.SUMMARY:
+            answer, inline_summary = split_inline_summary(llm_response)
+        
+        # Evaluate criteria; local checks run inline, only the LLM judge is awaited
+        checked = fast_check(answer, step.criteria_type, step.criteria_value)
+        if checked is None:
+            checked = await evaluate_criteria(
+                output=answer,
+                criteria_type=step.criteria_type,
+                criteria_value=step.criteria_value,
+                original_prompt=step.prompt
+            )
+        passed, details = checked
         
-        step_execution.criteria_passed = 1 if passed else 0
-        step_execution.criteria_details = details
-        db.commit()
+        fields["criteria_passed"] = passed
+        fields["criteria_details"] = details
         
         logger.info(f"Criteria passed={passed}, details={details}")
         
         if passed:
             # Extract context for next step
-            output_context = extract_context(
-                output=llm_response,
-                context_mode=step.context_mode.value if hasattr(step.context_mode, 'value') else step.context_mode,
-                context_template=step.context_template
-            )
-            
-            # If summary mode, generate summary
-            if step.context_mode == ContextPassingMode.SUMMARY:
-                output_context = await summarize_for_context(llm_response)
+            if context_mode_str == ContextPassingMode.SUMMARY:
+                # Fall back to a separate summarization call if the model
+                # left out the inline summary
+                output_context = inline_summary or await summarize_for_context(answer)
+            else:
+                output_context = extract_context(
+                    output=llm_response,
+                    context_mode=context_mode_str,
+                    context_template=step.context_template
+                )
             
-            step_execution.output_context = output_context
-            step_execution.status = StepStatus.COMPLETED
-            step_execution.completed_at = datetime.utcnow()
-            step_execution.error_message = None
-            db.commit()
+            fields["output_context"] = output_context
+            fields["status"] = StepStatus.COMPLETED
+            fields["completed_at"] = utcnow()
+            fields["error_message"] = None
+            await write_step_execution(db, step_execution_id, fields)
             
             return True, output_context
         else:
             # Criteria not met
-            step_execution.error_message = f"Criteria not met: {details}"
-            db.commit()
+            fields["error_message"] = f"Criteria not met: {details}"
+            if use_step_cache:
+                # Don't serve a response that failed the criteria again
+                await llm_cache.invalidate(model_to_use, full_prompt)
             
             if attempt < max_attempts:
-                await asyncio.sleep(1)  # Wait before retry
+                queue_step_execution_write(step_execution_id, fields)
+                await asyncio.sleep(jittered_backoff(attempt, CRITERIA_FAIL_BACKOFF_BASE))
                 continue
             else:
-                step_execution.status = StepStatus.FAILED
-                step_execution.completed_at = datetime.utcnow()
-                db.commit()
+                fields["status"] = StepStatus.FAILED
+                fields["completed_at"] = utcnow()
+                await write_step_execution(db, step_execution_id, fields)
                 return False, None
     
     return False, None
 
 
+def resolve_dependencies(steps: list[Step]) -> tuple[dict[int, list[int]], set[int]]:
+    """
+    Map each step ID to the IDs of the steps it depends on.
+    
+    A step's depends_on lists step orders. None means "the previous step", so
+    workflows that never set it keep running strictly in sequence.
+    
+    Args:
+        steps: The workflow's steps, sorted by order
+    
+    Returns:
+        Tuple of (dependencies by step ID, referenced orders that don't exist)
+    """
+    ids_by_order: dict[int, list[int]] = {}
+    for step in steps:
+        ids_by_order.setdefault(step.order, []).append(step.id)
+    
+    dependencies: dict[int, list[int]] = {}
+    unknown: set[int] = set()
+    for i, step in enumerate(steps):
+        if step.depends_on is None:
+            dependencies[step.id] = [steps[i - 1].id] if i > 0 else []
+            continue
+        dependencies[step.id] = []
+        for order in sorted(set(step.depends_on)):
+            if order not in ids_by_order:
+                unknown.add(order)
+            else:
+                dependencies[step.id].extend(ids_by_order[order])
+    return dependencies, unknown
+
+
+def join_contexts(upstream: list[tuple[Step, Optional[str]]]) -> Optional[str]:
+    """Combine the output contexts of a step's prerequisites into its input context."""
+    parts = [(step, context) for step, context in upstream if context]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0][1]
+    return "\n\n---\n\n".join(f"[{step.name}]\n{context}" for step, context in parts)
+
+
+async def run_step_in_own_session(
+    step: Step,
+    step_execution_id: int,
+    input_context: Optional[str]
+) -> tuple[bool, Optional[str]]:
+    """
+    Run execute_step with a dedicated session, so steps running at the same
+    time can commit concurrently (an AsyncSession is not safe to share).
+    """
+    async with get_db_session() as db:
+        return await execute_step(
+            step=step,
+            step_execution_id=step_execution_id,
+            input_context=input_context,
+            db=db
+        )
+
+
+async def step_failure_message(db: AsyncSession, step: Step, step_execution_id: int) -> str:
+    """Execution error for a failed step, with its attempt count and the step's own error."""
+    attempts, error = (await db.execute(
+        select(StepExecution.attempt_number, StepExecution.error_message)
+        .where(StepExecution.id == step_execution_id)
+    )).one()
+    if not attempts:
+        message = f"Step '{step.name}' failed without calling the LLM"
+    else:
+        message = f"Step '{step.name}' failed after {attempts} attempt{'s' if attempts != 1 else ''}"
+    return f"{message}: {error}" if error else message
+
+
 async def execute_workflow_async(execution_id: int):
     """
-    Execute a workflow asynchronously.
+    Execute a workflow asynchronously. Steps run as soon as the steps they
+    depend on have completed; independent steps run concurrently.
     
     Args:
         execution_id: The execution record ID
     """
     db = get_db_session()
+    running: dict[asyncio.Task, Step] = {}  # Step tasks in flight
     
     try:
-        # Load execution record
-        execution = db.query(Execution).filter(Execution.id == execution_id).first()
+        # Load execution record with its workflow, steps and step executions
+        # up front; lazy loads are not available on an async session
+        execution = (await db.execute(
+            select(Execution)
+            .options(
+                selectinload(Execution.workflow).selectinload(Workflow.steps),
+                selectinload(Execution.step_executions)
+            )
+            .where(Execution.id == execution_id)
+        )).scalar_one_or_none()
         if not execution:
             return
         
         # Update status to running
-        execution.status = ExecutionStatus.RUNNING
-        db.commit()
+        await write_execution(db, execution_id, status=ExecutionStatus.RUNNING)
         
         # Load workflow and steps
         workflow = execution.workflow
         steps = sorted(workflow.steps, key=lambda s: s.order)
         
         if not steps:
-            execution.status = ExecutionStatus.FAILED
-            execution.error_message = "Workflow has no steps"
-            execution.completed_at = datetime.utcnow()
-            db.commit()
+            await finish_execution(db, execution_id, ExecutionStatus.FAILED, "Workflow has no steps", roll_up_totals=False)
             return
         
-        # Execute steps in order
-        current_context: Optional[str] = None
+        # Resolve the step graph; steps with depends_on=None chain sequentially
+        dependencies, unknown = resolve_dependencies(steps)
+        if unknown:
+            await finish_execution(
+                db, execution_id, ExecutionStatus.FAILED,
+                f"Steps depend on unknown step orders: {sorted(unknown)}", roll_up_totals=False
+            )
+            return
         
-        for i, step in enumerate(steps):
-            # Add delay between steps to avoid rate limiting
-            if i > 0:
-                logger.info("Waiting 2 seconds before next step...")
-                await asyncio.sleep(2)
-            
-            logger.info(f"Starting step {step.order}: {step.name}")
-            execution.current_step_order = step.order
-            db.commit()
+        steps_by_id = {step.id: step for step in steps}
+        step_exec_ids = {se.step_id: se.id for se in execution.step_executions}
+        
+        # Create any missing step execution records with one multi-row INSERT,
+        # then read back their IDs in one SELECT (no RETURNING on MySQL)
+        missing = [step.id for step in steps if step.id not in step_exec_ids]
+        if missing:
+            await db.execute(insert_step_executions(execution_id, missing))
+            await db.commit()
+            step_exec_ids.update((await db.execute(
+                select(StepExecution.step_id, StepExecution.id)
+                .where(StepExecution.execution_id == execution_id, StepExecution.step_id.in_(missing))
+            )).tuples().all())
+        
+        # Start each step as its own task the moment its prerequisites are
+        # done, so it never waits on unrelated steps that are still running
+        contexts: dict[int, Optional[str]] = {}
+        waiting = [step.id for step in steps]
+        failed_step: Optional[Step] = None
+        
+        while True:
+            if failed_step is None:
+                ready_steps = [
+                    steps_by_id[step_id] for step_id in waiting
+                    if all(dep in contexts for dep in dependencies[step_id])
+                ]
+                if ready_steps:
+                    waiting = [step_id for step_id in waiting if step_id not in {s.id for s in ready_steps}]
+                    logger.info(f"Starting step(s): {', '.join(f'{s.order}: {s.name}' for s in ready_steps)}")
+                    await write_execution(db, execution_id, current_step_order=ready_steps[0].order)
+                    for step in ready_steps:
+                        task = asyncio.create_task(run_step_in_own_session(
+                            step,
+                            step_exec_ids[step.id],
+                            join_contexts([(steps_by_id[dep], contexts[dep]) for dep in dependencies[step.id]])
+                        ))
+                        running[task] = step
             
-            # Find the step execution record
-            step_execution = db.query(StepExecution).filter(
-                StepExecution.execution_id == execution_id,
-                StepExecution.step_id == step.id
-            ).first()
+            if not running:
+                break
             
-            if not step_execution:
-                # Create one if it doesn't exist
-                step_execution = StepExecution(
-                    execution_id=execution_id,
-                    step_id=step.id,
-                    status=StepStatus.PENDING
-                )
-                db.add(step_execution)
-                db.commit()
-            
-            # Execute the step
-            success, output_context = await execute_step(
-                step=step,
-                step_execution=step_execution,
-                input_context=current_context,
-                db=db
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                step = running.pop(task)
+                success, output_context = task.result()
+                if not success:
+                    logger.error(f"Step '{step.name}' failed!")
+                    # Start nothing new; steps already running finish normally
+                    failed_step = failed_step or step
+                    continue
+                
+                # Make context available to dependent steps
+                logger.info(f"Step '{step.name}' completed successfully")
+                contexts[step.id] = output_context
+        
+        if failed_step is not None:
+            # Failed runs still spent tokens on the steps that ran
+            await finish_execution(
+                db, execution_id, ExecutionStatus.FAILED,
+                await step_failure_message(db, failed_step, step_exec_ids[failed_step.id])
             )
-            
-            if not success:
-                logger.error(f"Step '{step.name}' failed!")
-                execution.status = ExecutionStatus.FAILED
-                execution.error_message = f"Step '{step.name}' failed after {step.max_retries + 1} attempts"
-                execution.completed_at = datetime.utcnow()
-                db.commit()
-                return
-            
-            # Pass context to next step
-            logger.info(f"Step '{step.name}' completed successfully")
-            current_context = output_context
+            return
+        
+        if waiting:
+            await finish_execution(
+                db, execution_id, ExecutionStatus.FAILED,
+                "Step dependencies form a cycle", roll_up_totals=False
+            )
+            return
         
         # All steps completed - calculate total costs
         logger.info(f"Workflow execution {execution_id} completed successfully!")
         
         # Aggregate token usage and costs from all step executions
-        total_tokens = 0
-        total_cost = 0.0
-        for se in execution.step_executions:
-            total_tokens += se.total_tokens or 0
-            try:
-                total_cost += float(se.cost_usd or "0")
-            except ValueError:
-                pass
-        
-        execution.total_tokens = total_tokens
-        execution.total_cost_usd = str(round(total_cost, 6))
-        execution.status = ExecutionStatus.COMPLETED
-        execution.completed_at = datetime.utcnow()
-        execution.error_message = None
-        db.commit()
+        await finish_execution(db, execution_id, ExecutionStatus.COMPLETED)
         
     except Exception as e:
         # Handle unexpected errors
         logger.exception(f"Unexpected error in execution {execution_id}: {e}")
-        execution = db.query(Execution).filter(Execution.id == execution_id).first()
-        if execution:
-            execution.status = ExecutionStatus.FAILED
-            execution.error_message = f"Unexpected error: {str(e)}"
-            execution.completed_at = datetime.utcnow()
-            db.commit()
+        for task in running:
+            task.cancel()
+        await db.rollback()
+        await finish_execution(db, execution_id, ExecutionStatus.FAILED, f"Unexpected error: {str(e)}")
     finally:
-        db.close()
+        await db.close()
+
+
+# All executions share one long-lived event loop running in a daemon thread,
+# so loops, HTTP connections and async DB connections are reused across runs
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def get_executor_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared executor loop, starting its thread on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="workflow-executor", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def _log_execution_failure(future):
+    """Surface errors that escaped execute_workflow_async's own handling."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Workflow execution crashed: {future.exception()!r}")
 
 
 def execute_workflow(execution_id: int):
     """
     Entry point for background task execution.
-    Runs the async executor in an event loop.
+    Schedules the async executor on the shared loop and returns immediately,
+    so the background task thread is not held for the whole run.
     """
-    # Create a new event loop for this thread since we're running in a background task
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    future = asyncio.run_coroutine_threadsafe(execute_workflow_async(execution_id), get_executor_loop())
+    future.add_done_callback(_log_execution_failure)
+    return future
+
+
+async def _close_executor_resources():
+    """Flush buffered writes, then close the HTTP client and DB connections owned by the executor loop."""
+    global _writer_task
+    if _writer_task is not None:
+        _writer_task.cancel()
+        _writer_task = None
+        await flush_interim_writes()
+    await aclose()
+    await async_engine.dispose()
+    regex_guard.shutdown()
+
+
+def shutdown_executor(timeout: float = 10.0):
+    """
+    Release the executor loop's connections and stop the loop. Executions
+    still running are abandoned along with the daemon thread.
+    """
+    global _loop
+    with _loop_lock:
+        loop, _loop = _loop, None
+    if loop is None or loop.is_closed():
+        return
     try:
-        loop.run_until_complete(execute_workflow_async(execution_id))
+        asyncio.run_coroutine_threadsafe(_close_executor_resources(), loop).result(timeout)
+    except Exception as e:
+        logger.warning(f"Error while closing executor resources: {e}")
     finally:
-        loop.close()
+        loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,11 @@
+# conftest.py
+"""
+Test setup: keeps the LLM response cache off so importing the app does not
+create an on-disk cache, points the app at a throwaway SQLite database, and
+makes the app package importable.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("LLM_CACHE_DISABLED", "1")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
@@ -0,0 +1,70 @@
+# tests/test_criteria_checker.py
+import time
+import asyncio
+import pytest
+
+from app import regex_guard
+from app.enums import CriteriaType
+from app.criteria_checker import check_json_valid, check_regex, evaluate_criteria
+
+
+# ============ JSON VALID ============
+
+@pytest.mark.parametrize("output", [
+    "Sure: " + "[" * 3000 + "]",            # Unbalanced, closes once at the end
+    "x " + '{"a":[' * 3000 + "}",          # Unbalanced mix of objects and arrays
+    "Here: " + "[" * 3000 + "]" * 3000,    # Balanced at the end, deeper than the decoder follows
+])
+def test_json_valid_deep_nesting_returns_bool(output):
+    passed, details = check_json_valid(output)
+    assert isinstance(passed, bool)
+    assert details
+
+
+def test_json_valid_embedded_object():
+    assert check_json_valid('Result: {"a": [1, 2]} done')[0] is True
+
+
+def test_json_valid_plain_prose():
+    assert check_json_valid("no json here")[0] is False
+
+
+# ============ REGEX ============
+
+@pytest.mark.parametrize("output, pattern", [
+    ("الرقم ٤٢", r"\d+"),           # Arabic-Indic digits
+    ("naïve café", r"^\w+\s\w+$"),  # Accented word characters
+    ("ставка", r"\bставка\b"),      # Cyrillic word boundaries
+])
+def test_regex_unicode_classes_match_non_ascii(output, pattern):
+    assert check_regex(output, pattern)[0] is True
+
+
+def test_regex_escaped_backslash_is_literal():
+    assert check_regex(r"path\d", r"\\d")[0] is True
+    assert check_regex("42", r"\\d")[0] is False
+
+
+def test_regex_catastrophic_word_pattern_runs_linear():
+    # Exponential under backtracking (tens of seconds); RE2 answers at once
+    start = time.monotonic()
+    passed, _ = check_regex("a" * 28 + "!", r"(\w+\s?)+$")
+    assert passed is False
+    assert time.monotonic() - start < 1
+
+
+def test_regex_backtracking_only_pattern_matches_in_worker():
+    passed, details = asyncio.run(evaluate_criteria("hello", CriteriaType.REGEX, r"(\w)\1"))
+    assert passed is True
+    assert "ll" in details
+
+
+def test_regex_backtracking_only_pattern_times_out(monkeypatch):
+    # The backreference keeps this pattern off RE2
+    monkeypatch.setattr(regex_guard, "REGEX_TIMEOUT", 1.0)
+    start = time.monotonic()
+    passed, details = asyncio.run(evaluate_criteria("a" * 40 + "!", CriteriaType.REGEX, r"((\w+\s?)+)\1$"))
+    assert passed is False
+    assert "took longer" in details
+    assert time.monotonic() - start < 10
+    regex_guard.shutdown()
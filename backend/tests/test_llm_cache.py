@@ -0,0 +1,81 @@
+# tests/test_llm_cache.py
+import asyncio
+import diskcache
+import pytest
+
+from app import llm_cache
+
+
+@pytest.fixture(autouse=True)
+def step_cache(tmp_path, monkeypatch):
+    """The suite runs with the cache disabled; give these tests a private one."""
+    cache = diskcache.Cache(str(tmp_path))
+    monkeypatch.setattr(llm_cache, "cache", cache)
+    yield cache
+    cache.close()
+
+
+def counting_call(result: dict, release: asyncio.Event = None):
+    """Zero-argument call_fn returning result, optionally after release is set; counts its calls."""
+    calls = []
+
+    async def call_fn():
+        calls.append(1)
+        if release is not None:
+            await release.wait()
+        return result
+
+    return call_fn, calls
+
+
+def test_concurrent_misses_share_one_call():
+    ok = {"success": True, "response": "hi", "usage": {"total_tokens": 7}}
+
+    async def scenario():
+        release = asyncio.Event()
+        call_fn, calls = counting_call(ok, release)
+        first = asyncio.create_task(llm_cache.get_or_call("m", "p", call_fn))
+        second = asyncio.create_task(llm_cache.get_or_call("m", "p", call_fn))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await first, await second, calls
+
+    (first, first_hit), (second, second_hit), calls = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert (first, first_hit) == (ok, False)
+    # The joined caller spent no tokens
+    assert (second, second_hit) == ({**ok, "usage": {}}, True)
+    assert llm_cache.INFLIGHT == {}
+
+
+def test_successful_result_is_served_from_cache():
+    ok = {"success": True, "response": "hi", "usage": {"total_tokens": 7}}
+    call_fn, calls = counting_call(ok)
+
+    asyncio.run(llm_cache.get_or_call("m", "p", call_fn))
+    result, hit = asyncio.run(llm_cache.get_or_call("m", "p", call_fn))
+
+    assert len(calls) == 1
+    assert (result, hit) == ({**ok, "usage": {}}, True)
+
+
+def test_failed_result_is_not_cached():
+    failed = {"success": False, "error": "boom"}
+    call_fn, calls = counting_call(failed)
+
+    asyncio.run(llm_cache.get_or_call("m", "p", call_fn))
+    result, hit = asyncio.run(llm_cache.get_or_call("m", "p", call_fn))
+
+    assert len(calls) == 2
+    assert (result, hit) == (failed, False)
+
+
+def test_invalidate_drops_entry():
+    ok = {"success": True, "response": "hi", "usage": {}}
+    call_fn, calls = counting_call(ok)
+
+    asyncio.run(llm_cache.get_or_call("m", "p", call_fn))
+    asyncio.run(llm_cache.invalidate("m", "p"))
+    asyncio.run(llm_cache.get_or_call("m", "p", call_fn))
+
+    assert len(calls) == 2
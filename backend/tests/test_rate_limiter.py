@@ -0,0 +1,31 @@
+# tests/test_rate_limiter.py
+import pytest
+
+from app.rate_limiter import TokenBucket, get_limiter
+
+
+def test_burst_is_free_then_reservations_queue_up():
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Each further caller waits one more interval (1 / rate) than the last
+    assert bucket.reserve() == pytest.approx(0.5, abs=0.01)
+    assert bucket.reserve() == pytest.approx(1.0, abs=0.01)
+
+
+def test_tokens_refill_over_time_up_to_capacity():
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    for _ in range(3):
+        bucket.reserve()
+
+    bucket.updated -= 1.0  # One second passes: two tokens back
+    assert [bucket.reserve() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.reserve() > 0
+
+    bucket.updated -= 60.0  # Idle for long: refills only to capacity
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() > 0
+
+
+def test_models_share_one_bucket_each():
+    assert get_limiter("test-model-a") is get_limiter("test-model-a")
+    assert get_limiter("test-model-a") is not get_limiter("test-model-b")
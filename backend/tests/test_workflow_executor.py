@@ -0,0 +1,230 @@
+# tests/test_workflow_executor.py
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+from app import workflow_executor
+from app.database import Base, engine, SessionLocal
+from app.models import (
+    Workflow, Step, Execution, StepExecution, StepStatus, ExecutionStatus, CriteriaType, TASK_DELIMITER,
+)
+from app.workflow_executor import (
+    get_executor_loop, get_db_session, flush_interim_writes, write_step_execution, utcnow,
+    resolve_dependencies, execute_workflow_async,
+)
+
+
+def run(coro, timeout: float = 30):
+    """Run a coroutine on the executor loop, which owns the async DB connections."""
+    return asyncio.run_coroutine_threadsafe(coro, get_executor_loop()).result(timeout)
+
+
+@pytest.fixture(autouse=True)
+def fresh_db():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    workflow_executor._pending_writes.clear()
+    workflow_executor._flushing_writes.clear()
+    yield
+
+
+@pytest.fixture
+def step_execution_id():
+    with SessionLocal() as db:
+        workflow = Workflow(name="w", steps=[Step(order=1, name="s", prompt="p")])
+        execution = Execution(workflow=workflow)
+        step_execution = StepExecution(execution=execution, step=workflow.steps[0])
+        db.add(step_execution)
+        db.commit()
+        return step_execution.id
+
+
+def load(step_execution_id: int) -> StepExecution:
+    with SessionLocal() as db:
+        return db.get(StepExecution, step_execution_id)
+
+
+class FailingSession:
+    """Stands in for an AsyncSession whose flush fails, optionally once `release` is set."""
+    def __init__(self, release: asyncio.Event = None):
+        self.release = release
+
+    async def __aenter__(self):
+        if self.release is not None:
+            await self.release.wait()
+        raise RuntimeError("database unavailable")
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+# ============ INTERIM WRITES ============
+
+def test_failed_flush_requeues_fields(step_execution_id, monkeypatch):
+    monkeypatch.setattr(workflow_executor, "get_db_session", lambda: FailingSession())
+    workflow_executor._pending_writes[step_execution_id] = {"prompt_sent": "full prompt", "input_context_len": 4}
+
+    run(flush_interim_writes())
+
+    assert workflow_executor._pending_writes[step_execution_id] == {"prompt_sent": "full prompt", "input_context_len": 4}
+    assert not workflow_executor._flushing_writes
+
+    # The terminal write carries the re-queued fields
+    monkeypatch.setattr(workflow_executor, "get_db_session", get_db_session)
+
+    async def finish():
+        async with get_db_session() as db:
+            await write_step_execution(db, step_execution_id, {"status": StepStatus.COMPLETED, "completed_at": utcnow()})
+
+    run(finish())
+    row = load(step_execution_id)
+    assert (row.status, row.prompt_sent, row.input_context_len) == (StepStatus.COMPLETED, "full prompt", 4)
+    assert step_execution_id not in workflow_executor._pending_writes
+
+
+def test_terminal_write_during_failing_flush_keeps_fields(step_execution_id, monkeypatch):
+    async def scenario():
+        release = asyncio.Event()
+        monkeypatch.setattr(workflow_executor, "get_db_session", lambda: FailingSession(release))
+        workflow_executor._pending_writes[step_execution_id] = {"prompt_sent": "full prompt"}
+        flush = asyncio.create_task(flush_interim_writes())
+        await asyncio.sleep(0)
+        assert step_execution_id in workflow_executor._flushing_writes
+
+        # The step finishes while its interim batch is still in flight
+        async with get_db_session() as db:
+            await write_step_execution(db, step_execution_id, {"status": StepStatus.FAILED, "completed_at": utcnow()})
+        release.set()
+        await flush
+
+    run(scenario())
+    row = load(step_execution_id)
+    assert (row.status, row.prompt_sent) == (StepStatus.FAILED, "full prompt")
+    # Already written by the terminal write, so not re-queued
+    assert step_execution_id not in workflow_executor._pending_writes
+
+
+def test_late_flush_does_not_overwrite_terminal_status(step_execution_id):
+    async def scenario():
+        async with get_db_session() as db:
+            await write_step_execution(db, step_execution_id, {"status": StepStatus.COMPLETED, "completed_at": utcnow()})
+        workflow_executor._pending_writes[step_execution_id] = {"status": StepStatus.RETRYING}
+        await flush_interim_writes()
+
+    run(scenario())
+    assert load(step_execution_id).status == StepStatus.COMPLETED
+
+
+# ============ STEP SCHEDULING ============
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    """
+    Replace call_llm with a stub and return the prompts it receives. A step
+    prompt containing FAIL gets an answer that misses its criteria, one
+    containing SLOW answers only after a delay.
+    """
+    prompts = []
+
+    async def fake_call_llm(model: str, prompt: str, **kwargs):
+        prompts.append(prompt)
+        task = prompt.rsplit(TASK_DELIMITER, 1)[-1]
+        if "SLOW" in task:
+            await asyncio.sleep(0.3)
+        response = "nope" if "FAIL" in task else f"ok {task.lower()}"
+        return {"success": True, "response": response, "usage": {}}
+
+    monkeypatch.setattr(workflow_executor, "call_llm", fake_call_llm)
+    return prompts
+
+
+def create_execution(*steps: tuple) -> int:
+    """Create a workflow from (order, name, prompt, depends_on) tuples and an execution of it."""
+    with SessionLocal() as db:
+        workflow = Workflow(name="w", steps=[
+            Step(
+                order=order, name=name, prompt=prompt, depends_on=depends_on,
+                criteria_type=CriteriaType.CONTAINS, criteria_value="ok", max_retries=0
+            )
+            for order, name, prompt, depends_on in steps
+        ])
+        execution = Execution(workflow=workflow)
+        db.add(execution)
+        db.commit()
+        return execution.id
+
+
+def load_execution(execution_id: int) -> tuple[Execution, dict[str, StepExecution]]:
+    """The execution and its step executions keyed by step name."""
+    with SessionLocal() as db:
+        execution = db.get(Execution, execution_id)
+        step_executions = db.query(StepExecution).filter_by(execution_id=execution_id).all()
+        return execution, {se.step.name: se for se in step_executions}
+
+
+def test_resolve_dependencies_defaults_to_previous_step():
+    steps = [
+        SimpleNamespace(id=10, order=1, depends_on=None),
+        SimpleNamespace(id=20, order=2, depends_on=None),
+        SimpleNamespace(id=30, order=3, depends_on=[]),
+        SimpleNamespace(id=40, order=4, depends_on=[1, 3, 9]),
+    ]
+    dependencies, unknown = resolve_dependencies(steps)
+    assert dependencies == {10: [], 20: [10], 30: [], 40: [10, 30]}
+    assert unknown == {9}
+
+
+def test_unknown_dependency_fails_before_any_call(llm_calls):
+    execution_id = create_execution((1, "a", "first", None), (2, "b", "second", [5]))
+    run(execute_workflow_async(execution_id))
+
+    execution, _ = load_execution(execution_id)
+    assert execution.status == ExecutionStatus.FAILED
+    assert execution.error_message == "Steps depend on unknown step orders: [5]"
+    assert llm_calls == []
+
+
+def test_dependency_cycle_fails_execution(llm_calls):
+    execution_id = create_execution((1, "a", "first", [2]), (2, "b", "second", [1]))
+    run(execute_workflow_async(execution_id))
+
+    execution, _ = load_execution(execution_id)
+    assert execution.status == ExecutionStatus.FAILED
+    assert execution.error_message == "Step dependencies form a cycle"
+    assert llm_calls == []
+
+
+def test_failure_drains_running_steps_and_starts_no_new_ones(llm_calls):
+    execution_id = create_execution(
+        (1, "a", "FAIL fast", []),
+        (2, "b", "SLOW step", []),
+        (3, "c", "after b", [2]),
+    )
+    run(execute_workflow_async(execution_id))
+
+    execution, step_executions = load_execution(execution_id)
+    assert execution.status == ExecutionStatus.FAILED
+    assert execution.error_message.startswith("Step 'a' failed after 1 attempt: Criteria not met")
+    # b was already running when a failed, so it finishes and is recorded
+    assert step_executions["b"].status == StepStatus.COMPLETED
+    assert step_executions["b"].completed_at is not None
+    # c depends on b, but nothing new starts after a failure
+    assert step_executions["c"].status == StepStatus.PENDING
+    assert len(llm_calls) == 2
+
+
+def test_step_with_several_prerequisites_gets_joined_contexts(llm_calls):
+    execution_id = create_execution(
+        (1, "a", "Alpha", []),
+        (2, "b", "Beta", []),
+        (3, "c", "Gamma", [1, 2]),
+        (4, "d", "Delta", None),
+    )
+    run(execute_workflow_async(execution_id))
+
+    execution, step_executions = load_execution(execution_id)
+    assert execution.status == ExecutionStatus.COMPLETED
+    assert step_executions["c"].input_context == "[a]\nok alpha\n\n---\n\n[b]\nok beta"
+    # depends_on=None chains onto the previous step only
+    assert step_executions["d"].input_context == "ok gamma"
+    assert step_executions["c"].prompt_sent.endswith(TASK_DELIMITER + "Gamma")
@@ -0,0 +1,211 @@
+# upgrade_db.py
+"""
+Upgrades a database created before the enum/cost/boolean column changes to the
+current models. create_all only creates missing tables, so existing tables
+keep their old column types until this script converts them.
+
+Run it once from backend/, with the same DATABASE_URL / PORT settings as the
+app, while the app is stopped:
+
+    python upgrade_db.py
+
+Every step checks the live schema first, so re-running it is harmless.
+
+What it changes:
+- steps.criteria_type, steps.context_mode, executions.status and
+  step_executions.status: ENUM/VARCHAR names -> SMALLINT codes (enum
+  definition order, see SmallIntEnum)
+- executions.total_cost_usd, step_executions.cost_usd: VARCHAR -> NUMERIC(18,6)
+- step_executions.criteria_passed: INTEGER -> BOOLEAN NOT NULL
+- Adds the columns listed in ADDED_COLUMNS and any missing indexes
+"""
+from sqlalchemy import inspect, Integer, Numeric, Boolean
+from sqlalchemy.dialects.mysql import TINYINT
+
+from app.database import engine, Base
+from app import models  # noqa: F401  (registers the tables on Base.metadata)
+from app.enums import StepStatus, ExecutionStatus, CriteriaType, ContextPassingMode
+
+# Columns stored as SmallIntEnum codes
+ENUM_COLUMNS = {
+    ("steps", "criteria_type"): CriteriaType,
+    ("steps", "context_mode"): ContextPassingMode,
+    ("executions", "status"): ExecutionStatus,
+    ("step_executions", "status"): StepStatus,
+}
+
+# Columns that held the cost as a decimal string
+COST_COLUMNS = [("executions", "total_cost_usd"), ("step_executions", "cost_usd")]
+
+# Columns that held a boolean as 0/1
+BOOL_COLUMNS = [("step_executions", "criteria_passed")]
+
+# Columns added since the original schema, with the DDL to add them
+ADDED_COLUMNS = {
+    ("steps", "depends_on"): "JSON",
+    ("step_executions", "cache_hit"): "BOOLEAN NOT NULL DEFAULT FALSE",
+    # The context now lives only in prompt_sent; older rows keep input_context
+    ("step_executions", "input_context_sha256"): "VARCHAR(64)",
+    ("step_executions", "input_context_len"): "INTEGER",
+}
+
+
+# ============ SQL EXPRESSIONS ============
+
+def enum_code_sql(column: str, enum_class, text_column: str = None) -> str:
+    """
+    CASE expression mapping a stored enum name or value to its SMALLINT code.
+    SQLAlchemy's Enum stored member names ('PENDING'); lowercasing matches the
+    values ('pending') as well.
+    """
+    text_column = text_column or column
+    whens = " ".join(
+        f"WHEN '{member.value}' THEN {code}" for code, member in enumerate(enum_class)
+    )
+    return f"CASE LOWER({text_column}) {whens} END"
+
+
+def _is_integer(col_type) -> bool:
+    return isinstance(col_type, Integer) and not isinstance(col_type, TINYINT)
+
+
+def _is_boolean(col_type) -> bool:
+    # MySQL reflects BOOLEAN as TINYINT(1)
+    return isinstance(col_type, (Boolean, TINYINT))
+
+
+# ============ PER-DIALECT CONVERSIONS ============
+
+def _convert_postgresql(conn, table: str, column: str, kind: str, col_type):
+    if kind == "enum":
+        case = enum_code_sql(column, ENUM_COLUMNS[(table, column)], f"{column}::text")
+        conn.exec_driver_sql(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE SMALLINT USING {case}")
+        if getattr(col_type, "name", None):
+            conn.exec_driver_sql(f"DROP TYPE IF EXISTS {col_type.name}")
+    elif kind == "cost":
+        conn.exec_driver_sql(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE NUMERIC(18,6) "
+            f"USING NULLIF({column}, '')::numeric"
+        )
+    elif kind == "bool":
+        conn.exec_driver_sql(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE BOOLEAN "
+            f"USING COALESCE({column}, 0) <> 0"
+        )
+        conn.exec_driver_sql(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL")
+
+
+def _convert_mysql(conn, table: str, column: str, kind: str, col_type):
+    if kind == "enum":
+        # Widen the ENUM to a string first so the codes can be written into it
+        conn.exec_driver_sql(f"ALTER TABLE {table} MODIFY {column} VARCHAR(20)")
+        case = enum_code_sql(column, ENUM_COLUMNS[(table, column)])
+        conn.exec_driver_sql(f"UPDATE {table} SET {column} = {case}")
+        conn.exec_driver_sql(f"ALTER TABLE {table} MODIFY {column} SMALLINT")
+    elif kind == "cost":
+        conn.exec_driver_sql(f"UPDATE {table} SET {column} = NULL WHERE {column} = ''")
+        conn.exec_driver_sql(f"ALTER TABLE {table} MODIFY {column} NUMERIC(18,6)")
+    elif kind == "bool":
+        conn.exec_driver_sql(f"UPDATE {table} SET {column} = 0 WHERE {column} IS NULL")
+        conn.exec_driver_sql(f"ALTER TABLE {table} MODIFY {column} BOOLEAN NOT NULL")
+
+
+def _rebuild_sqlite(conn, table: str, conversions: dict):
+    """
+    SQLite cannot change a column's type, so the table is recreated from the
+    current model and the rows are copied across, converting as they go.
+    """
+    inspector = inspect(conn)
+    old_columns = {col["name"] for col in inspector.get_columns(table)}
+    old_indexes = [index["name"] for index in inspector.get_indexes(table)]
+
+    # Keep other tables' foreign keys pointing at the table name, not the renamed copy
+    conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    conn.exec_driver_sql(f"ALTER TABLE {table} RENAME TO {table}_old")
+    for name in old_indexes:
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+    Base.metadata.tables[table].create(conn)
+
+    names, exprs = [], []
+    for column in Base.metadata.tables[table].columns:
+        if column.name not in old_columns:
+            continue
+        kind = conversions.get(column.name)
+        if kind == "enum":
+            expr = enum_code_sql(f'"{column.name}"', ENUM_COLUMNS[(table, column.name)])
+        elif kind == "cost":
+            expr = f"CAST(NULLIF({column.name}, '') AS NUMERIC)"
+        elif kind == "bool":
+            expr = f"COALESCE({column.name}, 0) <> 0"
+        else:
+            expr = f'"{column.name}"'
+        names.append(f'"{column.name}"')
+        exprs.append(expr)
+
+    conn.exec_driver_sql(
+        f"INSERT INTO {table} ({', '.join(names)}) SELECT {', '.join(exprs)} FROM {table}_old"
+    )
+    conn.exec_driver_sql(f"DROP TABLE {table}_old")
+    conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+
+
+# ============ UPGRADE ============
+
+def pending_conversions(conn) -> dict:
+    """
+    Find the columns whose stored type predates the current models.
+
+    Returns:
+        {table: {column: (kind, reflected type)}} with kind "enum", "cost" or "bool"
+    """
+    inspector = inspect(conn)
+    types = {}
+    for table in inspector.get_table_names():
+        for col in inspector.get_columns(table):
+            types[(table, col["name"])] = col["type"]
+
+    pending = {}
+    checks = (
+        [(key, "enum", _is_integer) for key in ENUM_COLUMNS]
+        + [(key, "cost", lambda t: isinstance(t, Numeric)) for key in COST_COLUMNS]
+        + [(key, "bool", _is_boolean) for key in BOOL_COLUMNS]
+    )
+    for (table, column), kind, is_current in checks:
+        col_type = types.get((table, column))
+        if col_type is not None and not is_current(col_type):
+            pending.setdefault(table, {})[column] = (kind, col_type)
+    return pending
+
+
+def upgrade():
+    """Bring the configured database up to the current schema."""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        tables = set(inspector.get_table_names())
+
+        for (table, column), ddl in ADDED_COLUMNS.items():
+            existing = {col["name"] for col in inspector.get_columns(table)} if table in tables else None
+            if existing is not None and column not in existing:
+                print(f"Adding {table}.{column}")
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+        for table, columns in pending_conversions(conn).items():
+            print(f"Converting {table}: {', '.join(columns)}")
+            if dialect == "sqlite":
+                _rebuild_sqlite(conn, table, {column: kind for column, (kind, _) in columns.items()})
+            else:
+                convert = _convert_postgresql if dialect == "postgresql" else _convert_mysql
+                for column, (kind, col_type) in columns.items():
+                    convert(conn, table, column, kind, col_type)
+
+        # New tables, then any index the existing tables are missing
+        Base.metadata.create_all(conn)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+    print("Database is up to date")
+
+
+if __name__ == "__main__":
+    upgrade()